@@ -0,0 +1,80 @@
+"""
+Compares the compiled schema codec of the couchbase driver with the
+field by field encode_field/decode_field functions.
+
+    python bench_codec.py
+"""
+
+import sys
+
+sys.path.append("../")
+
+from timeit import timeit
+from datetime import datetime, timezone
+
+from uzu.db.schema import Schema
+from uzu.db.field import *
+from uzu.db.driver.couchbase.codec import (
+	TYPE_FIELD,
+	encode_field,
+	decode_field,
+	schema_codec
+)
+
+
+class Wide(Schema):
+	@classmethod
+	def __fields__(cls):
+		fields = {
+			"text{}".format(n): StringField() for n in range(20)
+		}
+		fields.update({
+			"number{}".format(n): IntegerField() for n in range(20)
+		})
+		fields.update(
+			scores = ListField(FloatField()),
+			creation = DateTimeField(auto_now=True),
+			updated = DateTimeField(auto_now=True)
+		)
+		return fields
+
+
+data = {name: "text" for name in Wide.fields if name.startswith("text")}
+data.update({name: 42 for name in Wide.fields if name.startswith("number")})
+data.update(
+	scores = [0.5] * 20,
+	creation = datetime.now(timezone.utc),
+	updated = datetime.now(timezone.utc)
+)
+codec = schema_codec(Wide)
+doc = codec.encode(data)
+
+
+def encode_fields():
+	return {
+		name: encode_field(value, Wide.fields[name])
+		for name, value in data.items()
+	}
+
+def decode_fields():
+	return {
+		name: decode_field(value, Wide.fields[name])
+		for name, value in doc.items()
+		if name != TYPE_FIELD
+	}
+
+def encode_compiled():
+	return codec.encode(data)
+
+def decode_compiled():
+	return codec.decode(dict(doc))
+
+
+if __name__ == "__main__":
+	number = 20000
+	for name in ("encode", "decode"):
+		fields = timeit(globals()[name + "_fields"], number=number)
+		compiled = timeit(globals()[name + "_compiled"], number=number)
+		print("{}: fields {:.3f}s, compiled {:.3f}s, x{:.1f}".format(
+			name, fields, compiled, fields / compiled
+		))
@@ -0,0 +1,44 @@
+import sys
+
+sys.path.append("../")
+
+from time import sleep
+from unittest import TestCase, main
+
+from uzu.tools.cache import LRUCache
+
+
+class LRUCacheTestCase(TestCase):
+
+	def test_max_entries(self):
+		cache = LRUCache(max_entries=2)
+		cache.set("a", 1)
+		cache.set("b", 2)
+		self.assertEqual(cache.get("a"), 1)
+		cache.set("c", 3)
+		self.assertIsNone(cache.get("b"))
+		self.assertEqual(cache.get("a"), 1)
+		self.assertEqual(cache.get("c"), 3)
+		self.assertEqual(cache.evictions, 1)
+		self.assertEqual((cache.hits, cache.misses), (3, 1))
+
+	def test_max_size(self):
+		cache = LRUCache(max_size=10)
+		cache.set("a", 1, size=4)
+		cache.set("b", 2, size=4)
+		cache.set("c", 3, size=4)
+		self.assertNotIn("a", cache)
+		self.assertEqual(cache.size, 8)
+
+	def test_ttl(self):
+		cache = LRUCache(ttl=0.05)
+		cache.set("a", 1)
+		cache.set("b", 2, ttl=10)
+		sleep(0.1)
+		self.assertIsNone(cache.get("a"))
+		self.assertEqual(cache.get("b"), 2)
+		self.assertEqual(cache.expirations, 1)
+
+
+if __name__ == "__main__":
+	main()
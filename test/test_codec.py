@@ -0,0 +1,72 @@
+import sys
+
+sys.path.append("../")
+
+from datetime import datetime, timedelta, timezone
+from unittest import TestCase, main
+
+from uzu.db.field import DateTimeField
+from uzu.db.driver.couchbase import codec
+from uzu.db.driver.couchbase.codec import (
+	ISO_DATETIME,
+	decode_datetime,
+	field_encoder,
+	format_datetime,
+	parse_datetime
+)
+
+
+moment = datetime(2014, 3, 9, 17, 5, 42, 123456)
+
+values = [
+	moment,
+	moment.replace(tzinfo=timezone.utc),
+	moment.replace(tzinfo=timezone(timedelta(hours=2))),
+	moment.replace(tzinfo=timezone(-timedelta(hours=5, minutes=30)))
+]
+
+
+class DateTimeTestCase(TestCase):
+
+	def assertSameDateTime(self, parsed, value):
+		self.assertEqual(parsed, value)
+		self.assertEqual(parsed.utcoffset(), value.utcoffset())
+
+	def test_parse(self):
+		for value in values:
+			parsed = parse_datetime(value.strftime(ISO_DATETIME))
+			self.assertSameDateTime(parsed, value)
+
+	def test_format(self):
+		for value in values:
+			formatted = format_datetime(value)
+			self.assertEqual(formatted, value.strftime(ISO_DATETIME))
+			self.assertSameDateTime(parse_datetime(formatted), value)
+
+	def test_fallback(self):
+		fromisoformat = codec._fromisoformat
+		codec._fromisoformat = None
+
+		try:
+			self.test_parse()
+			self.test_format()
+		finally:
+			codec._fromisoformat = fromisoformat
+
+	def test_epoch(self):
+		encode = field_encoder(DateTimeField(epoch=True))
+
+		for value in values:
+			encoded = encode(value)
+			self.assertIsInstance(encoded, int)
+
+			if value.tzinfo is None:
+				value = value.replace(tzinfo=timezone.utc)
+
+			self.assertEqual(decode_datetime(encoded), value)
+
+		self.assertEqual(encode(codec.EPOCH), 0)
+
+
+if __name__ == "__main__":
+	main()
@@ -8,6 +8,8 @@ from tornado.testing import AsyncTestCase, gen_test, main
 from uzu.db.schema import Schema, drived
 from uzu.db.field import *
 import uzu.db.driver.couchbase as couchbase
+from uzu.db.driver.couchbase.view import ViewError
+from uzu.db.driver.couchbase.serializer import Serializer
 
 server = couchbase.Server()
 default_bucket = server.bucket()
@@ -18,11 +20,22 @@ class Test(Schema):
 	def __fields__(cls):
 		return dict(
 			name = StringField(required=True),
-			age = IntegerField(min=0),
+			age = IntegerField(min=0, indexed=True),
 			creation = DateTimeField(required=True, auto_now=True),
 			link = ForeignKeyField(schema=cls)
 		)
 
+@drived(default_bucket)
+class CompactTest(Schema):
+	compact = True
+
+	@classmethod
+	def __fields__(cls):
+		return dict(
+			name = StringField(required=True),
+			age = IntegerField(min=0)
+		)
+
 # music_bucket = CouchbaseSASLBucket("localhost", "music", "nab3shin")
 
 # class SASLTest(Model, driver=music_bucket):
@@ -64,6 +77,132 @@ class CouchbaseTestCase(AsyncTestCase):
 		yield test1.remove()
 		yield test2.remove()
 
+	@gen_test
+	def test_load_many(self):
+		tests = [Test(name="Test {}".format(n), age=n + 1) for n in range(10)]
+		for test in tests:
+			yield test.store()
+
+		keys = [test.key for test in tests]
+		default_bucket.cache.clear()
+		loaded = yield Test.load_many(keys + ["__missing__"])
+
+		self.assertEqual(set(loaded), set(keys))
+		for test in tests:
+			self.assertEqual(test, loaded[test.key])
+
+		for test in tests:
+			yield test.remove()
+
+	@gen_test
+	def test_concurrent_load(self):
+		tests = [Test(name="Test {}".format(n), age=n + 1) for n in range(10)]
+		for test in tests:
+			yield test.store()
+
+		keys = [test.key for test in tests]
+		default_bucket.cache.clear()
+		loaded = yield [Test.load(key) for key in keys + keys]
+
+		for test, entry in zip(tests + tests, loaded):
+			self.assertEqual(test, entry)
+		self.assertIs(loaded[0], loaded[len(keys)])
+
+		for test in tests:
+			yield test.remove()
+
+	@gen_test
+	def test_resolve(self):
+		leaf = Test(name="Leaf")
+		yield leaf.store()
+		middle = Test(name="Middle", link=leaf)
+		yield middle.store()
+		tests = [Test(name="Test {}".format(n), link=middle) for n in range(5)]
+		for test in tests:
+			yield test.store()
+
+		default_bucket.cache.clear()
+		loaded = yield Test.load_many([test.key for test in tests])
+		loaded = list(loaded.values())
+		yield Test.resolve(loaded, depth=2)
+
+		for entry in loaded:
+			self.assertIsInstance(entry["link"], Test)
+			self.assertEqual(entry["link"]["link"]["name"], "Leaf")
+
+		for test in tests + [middle, leaf]:
+			yield test.remove()
+
+	@gen_test
+	def test_resolve_cycle(self):
+		c = Test(name="C")
+		yield c.store()
+		b = Test(name="B", link=c)
+		yield b.store()
+		c["link"] = b
+		yield c.store()
+		a = Test(name="A", link=b)
+		yield a.store()
+
+		default_bucket.cache.clear()
+		a = yield Test.load(a.key)
+		yield Test.resolve([a], depth=3)
+
+		c = a["link"]["link"]
+		self.assertIsInstance(c["link"], Test)
+		self.assertIs(c["link"], a["link"])
+
+		for test in (a, a["link"], c):
+			yield test.remove()
+
+	@gen_test
+	def test_lookup(self):
+		yield default_bucket.publish_indexes(Test)
+		written = yield default_bucket.publish_indexes(Test)
+		self.assertFalse(written)
+
+		tests = [Test(name="Test {}".format(n), age=142) for n in range(5)]
+		for test in tests:
+			yield test.store()
+
+		found = []
+		cursor = Test.lookup("age", 142, stale="false")
+		while (yield cursor.fetch_next()):
+			found.append(cursor.next_entry())
+
+		self.assertEqual(
+			set(entry.key for entry in found),
+			set(test.key for test in tests)
+		)
+
+		for test in tests:
+			yield test.remove()
+
+	def test_lookup_serializer(self):
+		bucket = server.bucket(serializer=Serializer("json", "zlib"))
+		self.assertRaises(
+			ViewError,
+			bucket.lookup,
+			Test,
+			"age",
+			142
+		)
+
+	@gen_test
+	def test_compact(self):
+		test = CompactTest(name="Thomas", age=25)
+		self.assertFalse(hasattr(test, "__dict__"))
+
+		yield test.store()
+		default_bucket.cache.clear()
+		loaded = yield CompactTest.load(test.key)
+
+		self.assertEqual(dict(test), dict(loaded))
+		del loaded["age"]
+		self.assertEqual(list(loaded), ["name"])
+
+		yield test.remove()
+
 	# @gen_test
 	# def test_sasl_client(self):
 	# 	test = SASLTest(name="Thomas", age=19)
@@ -0,0 +1,65 @@
+import sys
+
+sys.path.append("../")
+
+from unittest import TestCase, main
+
+from uzu.tools.ketama import KetamaRing
+
+
+class KetamaTestCase(TestCase):
+
+	def test_weights(self):
+		ring = KetamaRing({"a:11211": 1, "b:11211": 1, "c:11211": 2})
+		self.assertEqual(len(ring), 3 * 160)
+		counts = {}
+		for n in range(10000):
+			node = ring.get("key{}".format(n))
+			counts[node] = counts.get(node, 0) + 1
+		self.assertGreater(counts["c:11211"], counts["a:11211"])
+		self.assertGreater(counts["c:11211"], counts["b:11211"])
+
+	def test_consistency(self):
+		ring = KetamaRing(["a:11211", "b:11211", "c:11211"])
+		grown = KetamaRing(["a:11211", "b:11211", "c:11211", "d:11211"])
+		for n in range(1000):
+			key = "key{}".format(n)
+			node = grown.get(key)
+			if node != "d:11211":
+				self.assertEqual(node, ring.get(key))
+
+	def test_libketama(self):
+		# Servers as libketama maps them, with the same servers and weights.
+		ring = KetamaRing({
+			"127.0.0.1:1": 400,
+			"127.0.0.1:2": 600,
+			"127.0.0.1:3": 600
+		})
+		self.assertEqual(len(ring), 480)
+		for key, node in (
+			("1", "127.0.0.1:3"),
+			("2", "127.0.0.1:2"),
+			("3", "127.0.0.1:3"),
+			("4", "127.0.0.1:1"),
+			("5", "127.0.0.1:3")
+		):
+			self.assertEqual(ring.get(key), node)
+
+		# libketama computes the shares with floats: 40 hashes per node here.
+		ring = KetamaRing(["10.0.0.{}:11211".format(n) for n in range(1, 8)])
+		self.assertEqual(len(ring), 7 * 160)
+		for key, node in (
+			("key0", "10.0.0.3:11211"),
+			("key1", "10.0.0.1:11211"),
+			("key26", "10.0.0.7:11211"),
+			("key47", "10.0.0.5:11211"),
+			("key86", "10.0.0.5:11211"),
+			("key145", "10.0.0.3:11211"),
+			("user:1", "10.0.0.4:11211"),
+			("foo", "10.0.0.7:11211")
+		):
+			self.assertEqual(ring.get(key), node)
+
+
+if __name__ == "__main__":
+	main()
@@ -5,7 +5,7 @@ sys.path.append("../")
 from tornado.ioloop import IOLoop
 from tornado.testing import AsyncTestCase, gen_test, main
 
-from uzu.tools.memcached import Memcached
+from uzu.tools.memcached import Memcached, MemcachedPool, MemcachedError
 
 
 client = Memcached("localhost", 11211)
@@ -30,16 +30,85 @@ class MemcachedTestCase(AsyncTestCase):
 		self.assertEqual(response.header.status, 0x0000)
 		response = yield client.get("__test__")
 		self.assertEqual(response.header.status, 0x0000)
-		self.assertEqual(response.value.decode(), string)
+		self.assertEqual(response.decode_value(), string)
 		reponse = yield client.delete("__test__")
 		self.assertEqual(response.header.status, 0x0000)
 
+	@gen_test
+	def test_query(self):
+		yield client.set("__test__", "value")
+		response = yield client.query(0x00, b"", "__test__")
+		self.assertEqual(response.decode_value(), "value")
+		self.assertEqual(response.request.key, b"__test__")
+		yield client.delete("__test__")
+
+	@gen_test
+	def test_pipeline(self):
+		keys = ["__test_{}__".format(n) for n in range(20)]
+		responses = yield [client.set(key, key) for key in keys]
+		for response in responses:
+			self.assertEqual(response.header.status, 0x0000)
+		responses = yield [client.get(key) for key in keys]
+		for key, response in zip(keys, responses):
+			self.assertEqual(response.decode_value(), key)
+		yield [client.delete(key) for key in keys]
+
+	@gen_test
+	def test_send_package(self):
+		request = client.make_request(0x0A)
+		response = yield client.send_package(
+			request.header,
+			request.extra,
+			request.key,
+			request.value
+		)
+		self.assertEqual(response.header.status, 0x0000)
+		self.assertEqual(response.header.opaque, request.header.opaque)
+
+	@gen_test
+	def test_get_multi(self):
+		keys = ["__test_{}__".format(n) for n in range(10)]
+		yield [client.set(key, key) for key in keys[::2]]
+		hits = yield client.get_multi(keys)
+		self.assertEqual(set(hits), set(keys[::2]))
+		for key, response in hits.items():
+			self.assertEqual(response.decode_value(), key)
+		yield [client.delete(key) for key in keys[::2]]
+
+	@gen_test
+	def test_store_multi(self):
+		items = {"__test_{}__".format(n): str(n) for n in range(10)}
+		failures = yield client.set_multi(items)
+		self.assertEqual(failures, {})
+		failures = yield client.add_multi(items)
+		self.assertEqual(set(failures), set(items))
+		failures = yield client.delete_multi(list(items) + ["__missing__"])
+		self.assertEqual(list(failures), ["__missing__"])
+
+	@gen_test
+	def test_pool(self):
+		pool = MemcachedPool(
+			"localhost",
+			11211,
+			max_connections=2,
+			max_pending=4
+		)
+		keys = ["__test_{}__".format(n) for n in range(10)]
+		yield [pool.set(key, key) for key in keys]
+		self.assertEqual(len(pool), 1)
+		responses = yield [pool.get(key) for key in keys]
+		self.assertLessEqual(len(pool), 2)
+		for key, response in zip(keys, responses):
+			self.assertEqual(response.decode_value(), key)
+		yield pool.delete_multi(keys)
+		pool.close()
+
 	@gen_test
 	def test_sasl(self):
 		# client = Memcached("localhost", 11211)
 		response = yield client.sasl_list_mecanisms()
 		self.assertEqual(response.header.status, 0x0000)
-		mecanisms = response.value.decode().split()
+		mecanisms = response.decode_value().split()
 		self.assertIn("PLAIN", mecanisms)
 		response = yield client.sasl_plain_auth(login="music", password="nab3shin")
 		string = "{\"value\": 19}"
@@ -47,9 +116,32 @@ class MemcachedTestCase(AsyncTestCase):
 		self.assertEqual(response.header.status, 0x0000)
 		response = yield client.get("__test__")
 		self.assertEqual(response.header.status, 0x0000)
-		self.assertEqual(response.value.decode(), string)
+		self.assertEqual(response.decode_value(), string)
 		reponse = yield client.delete("__test__")
 		self.assertEqual(response.header.status, 0x0000)
 
+
+class MemcachedPoolTestCase(AsyncTestCase):
+
+	@gen_test
+	def test_refused(self):
+		# Nothing listens on port 1.
+		pool = MemcachedPool(
+			"localhost",
+			1,
+			min_connections=0,
+			max_connections=1,
+			backoff=0.01
+		)
+		requests = [pool.get("__test__") for n in range(3)]
+		for request in requests:
+			with self.assertRaises(MemcachedError):
+				yield request
+		self.assertEqual(len(pool), 0)
+		with self.assertRaises(MemcachedError):
+			yield pool.get("__test__")
+		pool.close()
+
+
 if __name__ == "__main__":
 	main()
\ No newline at end of file
@@ -0,0 +1,160 @@
+import sys
+
+sys.path.append("../")
+
+from unittest import TestCase, main
+
+from tornado.gen import coroutine
+from tornado.testing import AsyncTestCase, gen_test
+
+from uzu.db.driver import Driver
+from uzu.db.schema import Schema, SchemaError, drived
+from uzu.db.field import *
+from uzu.tools.structure import structure
+
+
+class Person(Schema):
+	@classmethod
+	def __fields__(cls):
+		return dict(
+			name = StringField(required=True, max_length=20, pattern="[A-Z]"),
+			age = IntegerField(min=0),
+			scores = ListField(FloatField())
+		)
+
+
+class SchemaTestCase(TestCase):
+
+	def test_fields(self):
+		name = Person.fields["name"]
+		self.assertTrue(name.is_valid("Thomas"))
+		self.assertFalse(name.is_valid("thomas"))
+		self.assertFalse(name.is_valid("T" * 20))
+		self.assertFalse(name.is_valid(None))
+		self.assertFalse(Person.fields["age"].is_valid(0))
+		self.assertTrue(Person.fields["scores"].is_valid([1.0, 2.0]))
+		self.assertFalse(Person.fields["scores"].is_valid([1.0, 2]))
+
+	def test_is_valid(self):
+		person = Person(name="Thomas", age=25, scores=[1.0])
+		self.assertTrue(person.is_valid())
+		person["age"] = -1
+		self.assertFalse(person.is_valid())
+
+	def test_validate_many(self):
+		ages = IntegerField(min=0, max=100)
+		values = list(range(99)) + [1.0, 100]
+		self.assertEqual(
+			ages.validate_many(values),
+			[(0, "min"), (99, "type"), (100, "max")]
+		)
+
+		reports = Person.validate_many([
+			Person(name="Thomas", age=25),
+			dict(age=25),
+			dict(name="Amandine", scores=[1.0] * 100 + [2])
+		])
+		self.assertEqual(sorted(reports), [1, 2])
+		self.assertEqual(
+			[tuple(error) for error in reports[1]],
+			[("name", "required", None)]
+		)
+		self.assertEqual(reports[2][0].rule, "items")
+
+	def test_errors(self):
+		person = Person(name="Thomas", age=25)
+		self.assertEqual(person.errors(), [])
+		person["name"] = "thomas"
+		person["age"] = -1
+		self.assertEqual(
+			[tuple(error) for error in person.errors()],
+			[("name", "pattern", "thomas"), ("age", "min", -1)]
+		)
+
+	def test_required(self):
+		self.assertEqual(tuple(Person.required_fields()), ("name",))
+		self.assertRaises(SchemaError, Person, age=25)
+
+
+class MemoryDriver(Driver):
+	"""
+	Counts the writes of the entries it stores.
+	"""
+
+	Meta = structure("Meta", ("key", "cas"))
+
+	def __init__(self):
+		self.writes = 0
+
+	def load(self, key, model):
+		raise NotImplementedError
+
+	def load_many(self, keys, model, refresh_cache=True):
+		raise NotImplementedError
+
+	def reload(self, entry):
+		raise NotImplementedError
+
+	@coroutine
+	def store(self, entry):
+		dirty = entry.dirty_fields
+		self.writes += 1
+		entry.meta = self.Meta(str(self.writes), 0)
+		entry.mark_clean(*dirty)
+
+	def remove(self, entry):
+		raise NotImplementedError
+
+
+driver = MemoryDriver()
+StoredPerson = drived(driver)(Person)
+
+
+class DirtyFieldsTestCase(AsyncTestCase):
+
+	def test_changes(self):
+		person = Person(name="Thomas", age=25)
+		self.assertEqual(person.dirty_fields, {"name", "age"})
+
+		person.mark_clean("name")
+		self.assertEqual(person.dirty_fields, {"age"})
+		person.mark_clean()
+		self.assertEqual(person.dirty_fields, set())
+
+		person["age"] = 26
+		self.assertEqual(person.dirty_fields, {"age"})
+		person.mark_clean()
+		del person["age"]
+		self.assertEqual(person.dirty_fields, {"age"})
+
+	def test_mutable(self):
+		person = Person(name="Thomas", scores=[1.0])
+		person.mark_clean()
+		self.assertEqual(person.dirty_fields, set())
+		person["scores"].append(2.0)
+		self.assertEqual(person.dirty_fields, {"scores"})
+		person.mark_clean()
+		self.assertEqual(person.dirty_fields, set())
+
+	@gen_test
+	def test_store(self):
+		person = StoredPerson(name="Thomas", age=25)
+		yield person.store()
+		yield person.store()
+		self.assertEqual(driver.writes, 1)
+
+		person["age"] = 26
+		yield person.store()
+		self.assertEqual(driver.writes, 2)
+
+		listed = StoredPerson(name="Amandine", scores=[1.0])
+		yield listed.store()
+		listed["scores"].append(2.0)
+		yield listed.store()
+		self.assertEqual(driver.writes, 4)
+		yield listed.store()
+		self.assertEqual(driver.writes, 4)
+
+
+if __name__ == "__main__":
+	main()
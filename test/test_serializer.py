@@ -0,0 +1,60 @@
+import sys
+
+sys.path.append("../")
+
+from unittest import TestCase, main, skipIf
+
+from uzu.db.driver.couchbase.serializer import (
+	Serializer,
+	SerializerError,
+	formats
+)
+
+
+doc = {"name": "x" * 100, "tags": ["a", "b"], "age": 7}
+
+
+class SerializerTestCase(TestCase):
+
+	def test_json(self):
+		value, flags = Serializer().dumps(doc)
+		self.assertEqual(flags, 0)
+		self.assertEqual(Serializer().loads(value, flags), doc)
+
+	def test_threshold(self):
+		size = len(Serializer().dumps(doc)[0])
+
+		value, flags = Serializer(compression="zlib", threshold=size).dumps(doc)
+		self.assertEqual(flags, 0x0100)
+		self.assertLess(len(value), size)
+
+		serializer = Serializer(compression="zlib", threshold=size + 1)
+		value, flags = serializer.dumps(doc)
+		self.assertEqual(flags, 0)
+		self.assertEqual(len(value), size)
+
+	def test_flags(self):
+		plain = Serializer()
+		compressed = Serializer(compression="zlib", threshold=0)
+
+		for writer in (plain, compressed):
+			value, flags = writer.dumps(doc)
+
+			for reader in (plain, compressed):
+				self.assertEqual(reader.loads(value, flags), doc)
+
+	@skipIf("msgpack" not in formats, "msgpack is not installed")
+	def test_msgpack(self):
+		value, flags = Serializer("msgpack", "zlib", threshold=0).dumps(doc)
+		self.assertEqual(flags, 0x0101)
+		self.assertEqual(Serializer().loads(value, flags), doc)
+
+	def test_unknown_flags(self):
+		value, flags = Serializer().dumps(doc)
+		self.assertRaises(SerializerError, Serializer().loads, value, 0x00FE)
+		self.assertRaises(SerializerError, Serializer().loads, value, 0x0F00)
+		self.assertRaises(SerializerError, Serializer, "xml")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,242 @@
+import sys
+import json
+
+sys.path.append("../")
+
+from time import sleep
+from types import SimpleNamespace
+from urllib.parse import parse_qsl
+from unittest import TestCase, main
+
+from tornado.concurrent import Future
+from tornado.testing import AsyncTestCase, gen_test
+
+from uzu.db.driver.couchbase.view import (
+	BATCH_SIZE,
+	RowParser,
+	View,
+	ViewError,
+	ViewCache,
+	ViewQueue,
+	ViewCursor
+)
+
+
+class FakeView:
+	"""
+	Answers view queries over sorted rows, as the view port would.
+	"""
+
+	def __init__(self, size):
+		self.rows = [
+			{"id": "doc{:04}".format(n), "key": n // 3, "value": None}
+			for n in range(size)
+		]
+		self.fetches = 0
+
+	def _url(self, options):
+		return "http://localhost/?" + "&".join(
+			"{}={}".format(name, value) for name, value in options.items()
+		)
+
+	def _fetch_url(self, request):
+		self.fetches += 1
+		options = dict(parse_qsl(request.url.split("?", 1)[1]))
+		rows = self.rows
+
+		if "startkey" in options:
+			start = (json.loads(options["startkey"]), options["startkey_docid"])
+			rows = [row for row in rows if (row["key"], row["id"]) >= start]
+
+		rows = rows[:int(options.get("limit", len(rows)))]
+		body = json.dumps({"total_rows": len(self.rows), "rows": rows})
+		request.streaming_callback(body.encode())
+
+		future = Future()
+		future.set_result(None)
+		return future
+
+
+class FakeBucket:
+	"""
+	Loads entries which are their keys, and counts the keys of each load.
+	"""
+
+	def __init__(self):
+		self.batches = []
+
+	def load_many(self, keys, schema, refresh_cache=True):
+		self.batches.append(len(keys))
+		future = Future()
+		future.set_result({key: key for key in keys})
+		return future
+
+
+class FakeEntriesView(FakeView):
+
+	query = View.query
+	entries = View.entries
+
+	def __init__(self, size):
+		super().__init__(size)
+		self._options = {}
+		self._design = SimpleNamespace(_bucket=FakeBucket())
+
+
+class RowParserTestCase(TestCase):
+
+	def test_chunks(self):
+		body = (
+			'{"total_rows":3,"rows":[\n'
+			'{"id":"a","key":"]","value":null},\n'
+			'{"id":"é","key":[1,2],"value":{"n":1}}\n'
+			'],\n"errors":[{"from":"local","reason":"timeout"}]\n}'
+		).encode()
+
+		parser = RowParser()
+		rows = []
+		for n in range(0, len(body), 5):
+			rows.extend(parser.feed(body[n:n + 5]))
+		parser.close()
+
+		self.assertEqual([row["id"] for row in rows], ["a", "é"])
+		self.assertEqual(parser.total_rows, 3)
+		self.assertEqual(parser.errors[0]["reason"], "timeout")
+
+	def test_errors(self):
+		parser = RowParser()
+		parser.feed(b'{"error":"not_found","reason":"missing"}')
+		self.assertRaises(ViewError, parser.close)
+
+		parser = RowParser()
+		parser.feed(b'{"total_rows":3,"rows":[{"id":"a"}')
+		self.assertRaises(ViewError, parser.close)
+
+
+class ViewCursorTestCase(AsyncTestCase):
+
+	@gen_test
+	def test_pages(self):
+		view = FakeView(1000)
+		cursor = ViewCursor(view, {}, page_size=10)
+
+		yield cursor.fetch_next()
+		self.assertLessEqual(view.fetches, 2)
+
+		rows = []
+		while (yield cursor.fetch_next()):
+			rows.append(cursor.next_row())
+
+		self.assertEqual(rows, view.rows)
+		self.assertEqual(view.fetches, 100)
+		self.assertEqual(cursor.total_rows, 1000)
+
+
+class EntryCursorTestCase(AsyncTestCase):
+
+	@gen_test
+	def test_batches(self):
+		for page_size, fetches, batches in (
+			(100, 3, [100, 100, 50]),
+			(None, 1, [BATCH_SIZE, BATCH_SIZE, 250 - 2 * BATCH_SIZE])
+		):
+			view = FakeEntriesView(250)
+			cursor = view.entries(None, page_size=page_size)
+
+			entries = []
+			while (yield cursor.fetch_next()):
+				entries.append(cursor.next_entry())
+
+			self.assertEqual(entries, [row["id"] for row in view.rows])
+			self.assertEqual(view.fetches, fetches)
+			self.assertEqual(view._design._bucket.batches, batches)
+
+
+class ViewCacheTestCase(AsyncTestCase):
+
+	def fetch(self):
+		self.fetches.append(Future())
+		return self.fetches[-1]
+
+	@gen_test
+	def test_single_flight(self):
+		cache = ViewCache(ttl=60)
+		self.fetches = []
+
+		first = cache.get("key", self.fetch)
+		self.assertIs(first, cache.get("key", self.fetch))
+
+		self.fetches[0].set_result(["row"])
+		yield first
+
+		rows = yield cache.get("key", self.fetch)
+		self.assertEqual(rows, ["row"])
+		self.assertEqual(len(self.fetches), 1)
+
+	@gen_test
+	def test_resolved_fetch(self):
+		cache = ViewCache(ttl=60)
+		self.fetches = []
+
+		def fetch():
+			future = self.fetch()
+			future.set_result(["row"])
+			return future
+
+		rows = yield cache.get("key", fetch)
+		self.assertEqual(rows, ["row"])
+		rows = yield cache.get("key", fetch)
+		self.assertEqual(rows, ["row"])
+		self.assertEqual(len(self.fetches), 1)
+
+	@gen_test
+	def test_stale(self):
+		cache = ViewCache(ttl=0.01, stale_ttl=60)
+		self.fetches = []
+
+		first = cache.get("key", self.fetch)
+		self.fetches[0].set_result(["old"])
+		yield first
+		sleep(0.02)
+
+		rows = yield cache.get("key", self.fetch)
+		self.assertEqual(rows, ["old"])
+		self.assertEqual(len(self.fetches), 2)
+
+		refresh = cache._pending["key"]
+		self.fetches[1].set_result(["new"])
+		yield refresh
+
+		rows = yield cache.get("key", self.fetch)
+		self.assertEqual(rows, ["new"])
+
+
+class ViewQueueTestCase(AsyncTestCase):
+
+	def fetch(self, request):
+		self.fetches.append(Future())
+		return self.fetches[-1]
+
+	@gen_test
+	def test_max_concurrency(self):
+		queue = ViewQueue(max_concurrency=2)
+		self.fetches = []
+
+		responses = [queue.fetch(self, "url") for n in range(3)]
+		self.assertEqual((queue.active, queue.queued), (2, 1))
+
+		self.fetches[0].set_result("response")
+		yield responses[0]
+		self.assertEqual((queue.active, queue.queued), (2, 0))
+
+		for fetch in self.fetches[1:]:
+			fetch.set_result("response")
+		yield responses
+
+		stats = queue.stats()
+		self.assertEqual(stats["requests"], 3)
+		self.assertEqual(stats["active"], 0)
+
+
+if __name__ == "__main__":
+	main()
@@ -30,6 +30,16 @@ class Driver(metaclass=ABCMeta):
         """
         raise NotImplementedError
 
+    @abstractmethod
+    def load_many(self, keys, model, refresh_cache=True):
+        """
+        Fetch in database the entries referenced by "keys", at once.
+        Return a dict mapping the keys found to their entries.
+        The entries the driver holds are only fetched again if
+        "refresh_cache" is set.
+        """
+        raise NotImplementedError
+
     @abstractmethod
     def reload(self, entry):
         """
@@ -51,5 +61,13 @@ class Driver(metaclass=ABCMeta):
         """
         raise NotImplementedError
 
+    def lookup(self, model, field_name, value, **options):
+        """
+        Find in database the entries whose indexed field "field_name" holds
+        "value", and return an iterator over them. Drivers indexing fields
+        override it.
+        """
+        raise NotImplementedError
+
 
 
@@ -1,5 +1,5 @@
 
-from uzu.db.driver.couchbase.server import Server
+from uzu.db.driver.couchbase.server import Server, create_http_client
 from uzu.db.driver.couchbase.bucket import Bucket
 from uzu.db.driver.couchbase.design import Design
-from uzu.db.driver.couchbase.view import View
+from uzu.db.driver.couchbase.view import View, ViewCache, ViewQueue
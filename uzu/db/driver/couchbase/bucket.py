@@ -2,124 +2,476 @@
 import json
 
 from uuid import uuid4
+from struct import unpack
+from collections import OrderedDict
 from collections.abc import Sequence, Mapping
-from datetime import datetime
 
 from tornado.gen import coroutine
+from tornado.concurrent import Future
+from tornado.ioloop import IOLoop
 
 from uzu.db.driver import Driver
-from uzu.tools.memcached import Memcached
+from uzu.tools.memcached import (
+    MemcachedPool,
+    RequestError,
+    NotMyVbucketError,
+    status_reason
+)
 from uzu.tools.structure import structure
+from uzu.tools.cache import LRUCache
 from uzu.db.field import *
 
 from uzu.db.driver.couchbase.design import Design
+from uzu.db.driver.couchbase.view import ViewError
+from uzu.db.driver.couchbase.index import (
+    design_name,
+    view_name,
+    index_views,
+    index_key
+)
+from uzu.db.driver.couchbase.vbucket import VbucketMap
+from uzu.db.driver.couchbase.serializer import Serializer
+from uzu.db.driver.couchbase.codec import (
+    ISO_DATETIME,
+    encode_field,
+    decode_field,
+    schema_codec
+)
 
 
 Meta = structure("Meta", ("key", "cas"))
 
-ISO_DATE = "%Y-%m-%d"
-ISO_TIME = "%H:%M:%S.%f%z"
-ISO_DATETIME = ISO_DATE + 'T' + ISO_TIME
+class Bucket(Driver):
+    """
+    Couchbase Bucket
 
-def encode_field(value, field):
-    if isinstance(field, DateTimeField):
-        return value.strftime(ISO_DATETIME)
+    Unless a memcached port is given, in which case every request goes
+    through the proxy listening there, the bucket fetches its vBucket map
+    from the cluster configuration and sends each request straight to the
+    server owning the key, with the key's vbucket id. The map is refreshed
+    when a server answers that it does not own a vbucket anymore.
+
+    The connections authenticate with the bucket name and password, through
+    SASL, whenever a password is given. Without one, the connections to the
+    servers still authenticate, with an empty password, unless the bucket
+    is the "default" one, while those to a proxy do not.
+
+    Loaded and stored entries are kept in a bounded LRU cache, so loading a
+    cached key gives the same entry object. The entries of a schema expire
+    from the cache after its "cache_ttl" seconds, if it defines one.
+
+    Attributes:
+        max_attempts: how many times a request is sent while the cluster
+            topology changes.
+        cache: the LRUCache of the entries, sized by document length.
+        serializer: the Serializer of the documents.
+        view_cache: the ViewCache of the bucket views, if they are cached.
+    """
 
-    elif isinstance(field, ListField):
-        return [encode_field(item, field.field) for item in value]
-        
-    elif isinstance(field, ForeignKeyField):
-        return value.key
+    max_attempts = 3
+    view_cache = None
+
+    def __init__(
+        self,
+        server,
+        name,
+        port=None,
+        cache=None,
+        serializer=None,
+        password=None,
+        **pool_options
+    ):
+        self._server = server
+        self.name = name
+        self._port = port
 
-    else:
-        return value
+        if password or (port is None and name != "default"):
+            pool_options["credentials"] = (name, password or "")
 
-def decode_field(value, field):
-    if isinstance(field, DateTimeField):
-        return datetime.strptime(value, ISO_DATETIME)
+        self._pool_options = pool_options
+        self._pools = {}
+        self._vbucket_map_future = None
 
-    elif isinstance(field, ListField):
-        return [decode_field(item, field.field) for item in value]
+        if cache is None:
+            cache = LRUCache(max_entries=10000)
 
-    elif isinstance(field, ForeignKeyField):
-        return Proxy(key=value, schema=field.schema)
+        self.cache = cache
+        self.serializer = serializer or Serializer()
 
-    else:
-        return value
+        # The loads waiting for the next multi-get, and their futures.
+        self._load_queue = OrderedDict()
+        self._loading = {}
 
+    def _pool(self, node):
+        """
+        Returns the connection pool of a memcached server.
+        """
+        if node not in self._pools:
+            host, port = node.rsplit(":", 1)
+            self._pools[node] = MemcachedPool(
+                host,
+                int(port),
+                **self._pool_options
+            )
 
-class Bucket(Driver):
-    """
-    Couchbase Bucket
-    """
+        return self._pools[node]
 
-    def __init__(self, server, name, port):
-        self._server = server
-        self.name = name
-        self._port = port
+    @coroutine
+    def _fetch_vbucket_map(self):
+        url = "http://{}:{}/pools/default/buckets/{}".format(
+            self._server._host,
+            self._server._port,
+            self.name
+        )
+
+        response = yield self._server._http_client.fetch(url)
+        config = json.loads(response.body.decode())
+        vbucket_map = VbucketMap(config["vBucketServerMap"])
+
+        # Close the pools of the servers that left the cluster.
+        for node in set(self._pools) - set(vbucket_map.servers):
+            self._pools.pop(node).close()
+
+        return vbucket_map
+
+    def _vbucket_map(self, refresh=False):
+        """
+        Returns a future resolved with the vBucket map. Concurrent callers
+        share a single fetch.
+        """
+        future = self._vbucket_map_future
+
+        if (
+            future is None
+            or (future.done() and (refresh or future.exception()))
+        ):
+            future = self._vbucket_map_future = self._fetch_vbucket_map()
+
+        return future
+
+    @coroutine
+    def _route(self, key):
+        """
+        Returns the connection pool to send a key to, and the key's vbucket
+        id.
+        """
+        if self._port is not None:
+            node = "{}:{}".format(self._server._host, self._port)
+            return self._pool(node), 0
+
+        vbucket_map = yield self._vbucket_map()
+        node, vbucket_id = vbucket_map.route(key)
+
+        return self._pool(node), vbucket_id
+
+    @coroutine
+    def _query(self, command, key, *args, **kwargs):
+        """
+        Runs a memcached command on the server owning the key.
+        """
+        for attempt in range(1, self.max_attempts + 1):
+            pool, vbucket_id = yield self._route(key)
+
+            try:
+                response = yield getattr(pool, command)(
+                    key,
+                    *args,
+                    vbucket_id=vbucket_id,
+                    **kwargs
+                )
+            except NotMyVbucketError:
+                if attempt == self.max_attempts:
+                    raise
+
+                yield self._vbucket_map(refresh=True)
+            else:
+                return response
+
+    @coroutine
+    def _split(self, keys):
+        """
+        Groups keys by the server owning them.
+
+        return: A dict mapping the connection pools to the keys to send them,
+            and to the vbucket ids of those keys.
+        """
+        groups = {}
+
+        if self._port is not None:
+            node = "{}:{}".format(self._server._host, self._port)
+            groups[self._pool(node)] = (list(keys), {})
+            return groups
+
+        vbucket_map = yield self._vbucket_map()
+
+        for key in keys:
+            node, vbucket_id = vbucket_map.route(key)
+            batch, vbuckets = groups.setdefault(self._pool(node), ([], {}))
+            batch.append(key)
+            vbuckets[key] = vbucket_id
+
+        return groups
+
+    @coroutine
+    def _get_batch(self, pool, keys, vbuckets):
+        """
+        return: The responses of the keys found, and the keys to send again
+            because the server does not own their vbucket anymore.
+        """
+        try:
+            hits = yield pool.get_multi(keys, vbuckets=vbuckets)
+        except NotMyVbucketError:
+            return {}, keys
+
+        return hits, []
+
+    @coroutine
+    def _get_multi(self, keys):
+        """
+        Gets several keys in one round trip, with one batch per server.
+
+        return: A dict mapping the keys found to their responses.
+        """
+        hits = {}
+
+        for attempt in range(1, self.max_attempts + 1):
+            groups = yield self._split(keys)
+            results = yield [
+                self._get_batch(pool, batch, vbuckets)
+                for pool, (batch, vbuckets) in groups.items()
+            ]
+
+            keys = []
+
+            for found, moved in results:
+                hits.update(found)
+                keys.extend(moved)
+
+            if not keys:
+                break
+
+            if attempt == self.max_attempts:
+                raise NotMyVbucketError(status_reason[0x0007])
+
+            yield self._vbucket_map(refresh=True)
+
+        return hits
+
+    def _cache_entry(self, entry, size):
+        ttl = getattr(entry, "cache_ttl", None)
+        self.cache.set(entry.key, entry, size, ttl)
 
-        self._memcached_client = Memcached(self._server._host, self._port)
+    def _decode(self, response, schema):
+        flags, = unpack("!I", response.extra) if response.extra else (0,)
+        doc = self.serializer.loads(response.value, flags)
 
-        self._cache = {}
+        return schema_codec(schema).decode(doc)
 
     @coroutine
     def load(self, key, schema, refresh_cache=True):
-        if key not in self._cache:
-            response = yield self._memcached_client.get(key)
-            doc = json.loads(response.value.decode())
+        """
+        Loads an entry.
 
-            data = {}
-            for name, value in doc.items():
-                data[name] = decode_field(value, schema.fields[name])
+        The loads issued during an IOLoop iteration are sent together as a
+        single multi-get on the next iteration, and concurrent loads of the
+        same key share one request.
+        """
+        if not refresh_cache:
+            entry = self.cache.get(key)
 
-            entry = schema(data)
-            entry.meta = Meta(key, response.header.cas)
+            if entry is not None:
+                return entry
 
-            self._cache[key] = entry
+        future = self._loading.get(key)
 
-        elif refresh_cache:
-            yield self._cache[key].reload()
+        if future is None:
+            future = self._loading[key] = Future()
 
-        return self._cache[key]
+            if not self._load_queue:
+                IOLoop.current().add_callback(self._flush_loads)
+
+            self._load_queue[key] = schema
+
+        entry = yield future
+
+        return entry
+
+    def _flush_loads(self):
+        """
+        Sends the queued loads, with one load_many per schema.
+        """
+        queue, self._load_queue = self._load_queue, OrderedDict()
+        batches = {}
+
+        for key, schema in queue.items():
+            batches.setdefault(schema, []).append(key)
+
+        for schema, keys in batches.items():
+            self._load_batch(keys, schema)
 
     @coroutine
-    def reload(self, entry):
-        response = yield self._memcached_client.get(entry.key)
-        doc = json.loads(response.value.decode())
+    def _load_batch(self, keys, schema):
+        try:
+            entries = yield self.load_many(keys, schema)
+        except Exception as error:
+            for key in keys:
+                self._loading.pop(key).set_exception(error)
+
+            return
+
+        for key in keys:
+            future = self._loading.pop(key)
+
+            if key in entries:
+                future.set_result(entries[key])
+            else:
+                future.set_exception(RequestError(status_reason[0x0001]))
+
+    @coroutine
+    def load_many(self, keys, schema, refresh_cache=True):
+        """
+        Loads several entries with a single multi-get round trip.
+
+        Cached entries are returned as they are, or refreshed by the same
+        round trip when refresh_cache is set.
+
+        return: A dict mapping the keys found to their entries.
+        """
+        keys = list(OrderedDict.fromkeys(keys))
+        entries = {}
+
+        for key in keys:
+            entry = self.cache.get(key)
+
+            if entry is not None:
+                entries[key] = entry
+
+        if not refresh_cache:
+            keys = [key for key in keys if key not in entries]
+
+        responses = (yield self._get_multi(keys)) if keys else {}
+
+        for key in keys:
+            response = responses.get(key)
+
+            if response is None:
+                # The entry was removed from the database.
+                entries.pop(key, None)
+                self.cache.pop(key)
+                continue
 
-        data = {}
-        for name, value in doc.items():
-            data[name] = decode_field(value, entry.fields[name])
+            data = self._decode(response, schema)
+            entry = entries.get(key)
 
-        entry.update(data)
+            if entry is None:
+                entry = entries[key] = schema(data)
+                entry.meta = Meta(key, response.header.cas)
+            else:
+                entry.update(data)
+                entry.meta.cas = response.header.cas
+
+            entry.mark_clean()
+            self._cache_entry(entry, len(response.value))
+
+        return entries
+
+    @coroutine
+    def reload(self, entry):
+        response = yield self._query("get", entry.key)
+
+        entry.update(self._decode(response, type(entry)))
         entry.meta.cas = response.header.cas
+        entry.mark_clean()
+
+        self._cache_entry(entry, len(response.value))
 
     @coroutine
     def store(self, entry):
         meta = getattr(entry, "meta", None)
-        doc = {
-            name: encode_field(value, entry.fields[name])
-            for name, value in entry.items()
-        }
-
-        doc = json.dumps(doc)
-
-        if meta:
-            # Update the document in database
-            response = yield self._memcached_client.replace(meta.key, doc, entry.meta.cas)
-            entry.meta.cas = response.header.cas
-        else:
-            # Create the document in database
-            key = uuid4().hex
-            response = yield self._memcached_client.add(key, doc)
-            entry.meta = Meta(key, response.header.cas)
-            self._cache[key] = entry
+        dirty = entry.dirty_fields
+        doc = schema_codec(type(entry)).encode(entry._data)
+
+        doc, flags = self.serializer.dumps(doc)
+
+        # The entry is marked clean before the document is written, so that
+        # the changes made meanwhile, even inside values, stay dirty.
+        entry.mark_clean(*dirty)
+
+        try:
+            if meta:
+                # Update the document in database
+                response = yield self._query(
+                    "replace",
+                    meta.key,
+                    doc,
+                    entry.meta.cas,
+                    flags
+                )
+                entry.meta.cas = response.header.cas
+            else:
+                # Create the document in database
+                key = uuid4().hex
+                response = yield self._query("add", key, doc, flags=flags)
+                entry.meta = Meta(key, response.header.cas)
+        except Exception:
+            entry.mark_dirty(*dirty)
+            raise
+
+        self._cache_entry(entry, len(doc))
 
     @coroutine
     def remove(self, entry):
-        response = yield self._memcached_client.delete(entry.key)
-        del self._cache[entry.key]
+        response = yield self._query("delete", entry.key)
+        self.cache.pop(entry.key)
         del entry.meta
 
     def design(self, name):
-        return Design(self, name)
\ No newline at end of file
+        return Design(self, name)
+
+    def _check_indexable(self):
+        if self.serializer.format != "json" or self.serializer.compression:
+            raise ViewError(
+                "Views only index the documents stored as plain JSON, not "
+                "with the bucket serializer"
+            )
+
+    @coroutine
+    def publish_indexes(self, schema, username=None, password=None):
+        """
+        Creates or updates the design document of the views indexing the
+        fields of a schema declared as indexed, unless it is up to date.
+
+        The views can not read the documents stored in another format than
+        JSON, or compressed: a ViewError is raised unless the bucket
+        serializer stores plain JSON.
+
+        return: True if the design document was written.
+        """
+        self._check_indexable()
+
+        design = self.design(design_name(schema))
+        written = yield design.publish(index_views(schema), username, password)
+
+        return written
+
+    def lookup(self, schema, field_name, value, **options):
+        """
+        Finds the entries whose indexed field holds a value, or an item
+        equal to it for list fields, through the view indexing the field.
+        As for publish_indexes, the bucket serializer must store plain JSON.
+
+        parameters:
+            options: the options of View.entries, such as page_size.
+
+        return: An EntryCursor over the entries.
+        """
+        self._check_indexable()
+        field = schema.fields[field_name]
+
+        if not field.indexed:
+            raise ViewError("'{}' field is not indexed".format(field_name))
+
+        view = self.design(design_name(schema)).view(view_name(field_name))
+        options["key"] = index_key(field, value)
+
+        return view.entries(schema, **options)
\ No newline at end of file
@@ -0,0 +1,263 @@
+"""This file is part of Uzu.
+
+Uzu is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Uzu is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with Uzu.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from datetime import datetime, timedelta, timezone
+from operator import attrgetter
+from weakref import WeakKeyDictionary
+
+from uzu.db.field import *
+
+
+ISO_DATE = "%Y-%m-%d"
+ISO_TIME = "%H:%M:%S.%f%z"
+ISO_DATETIME = ISO_DATE + 'T' + ISO_TIME
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+
+# The document field naming the schema of the document.
+TYPE_FIELD = "uzu_type"
+
+_fromisoformat = getattr(datetime, "fromisoformat", None)
+_timezones = {"": None, "+0000": timezone.utc}
+
+def format_datetime(value):
+    """
+    Formats a datetime as ISO_DATETIME, without going through strftime.
+    """
+    offset = value.utcoffset()
+
+    if offset is None:
+        zone = ""
+    elif not offset:
+        zone = "+0000"
+    else:
+        return value.strftime(ISO_DATETIME)
+
+    return "%04d-%02d-%02dT%02d:%02d:%02d.%06d%s" % (
+        value.year,
+        value.month,
+        value.day,
+        value.hour,
+        value.minute,
+        value.second,
+        value.microsecond,
+        zone
+    )
+
+def _timezone(zone):
+    try:
+        return _timezones[zone]
+    except KeyError:
+        sign = -1 if zone[0] == "-" else 1
+        offset = timedelta(hours=int(zone[1:3]), minutes=int(zone[-2:]))
+        tz = _timezones[zone] = timezone(sign * offset)
+        return tz
+
+def parse_datetime(value):
+    """
+    Parses an ISO 8601 datetime, such as ISO_DATETIME ones, without going
+    through strptime unless the value is not in a format it knows.
+    """
+    if _fromisoformat is not None:
+        try:
+            return _fromisoformat(value)
+        except ValueError:
+            pass
+
+    try:
+        if value[4] + value[7] + value[10] + value[19] != "--T.":
+            raise ValueError(value)
+
+        return datetime(
+            int(value[0:4]),
+            int(value[5:7]),
+            int(value[8:10]),
+            int(value[11:13]),
+            int(value[14:16]),
+            int(value[17:19]),
+            int(value[20:26]),
+            _timezone(value[26:])
+        )
+    except (ValueError, IndexError):
+        return datetime.strptime(value, ISO_DATETIME)
+
+def encode_epoch(value):
+    """
+    Encodes a datetime as microseconds since the epoch. Naive datetimes are
+    taken as UTC ones.
+    """
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+
+    return (value - EPOCH) // MICROSECOND
+
+def decode_datetime(value):
+    """
+    Decodes a datetime stored as an ISO_DATETIME string or as microseconds
+    since the epoch.
+    """
+    if isinstance(value, int):
+        return EPOCH + timedelta(microseconds=value)
+
+    return parse_datetime(value)
+
+def encode_field(value, field):
+    if isinstance(field, DateTimeField):
+        return field_encoder(field)(value)
+
+    elif isinstance(field, ListField):
+        return [encode_field(item, field.field) for item in value]
+
+    elif isinstance(field, ForeignKeyField):
+        return value.key
+
+    else:
+        return value
+
+def decode_field(value, field):
+    if isinstance(field, DateTimeField):
+        return decode_datetime(value)
+
+    elif isinstance(field, ListField):
+        return [decode_field(item, field.field) for item in value]
+
+    elif isinstance(field, ForeignKeyField):
+        return Proxy(key=value, schema=field.schema)
+
+    else:
+        return value
+
+
+#========================#
+# Compiled schema codecs #
+#========================#
+
+def _list_converter(convert):
+    def convert_list(value):
+        return [convert(item) for item in value]
+
+    return convert_list
+
+def field_encoder(field):
+    """
+    Returns the function encoding the values of a field, or None if they
+    are stored as they are.
+    """
+    if isinstance(field, DateTimeField):
+        return encode_epoch if field.epoch else format_datetime
+
+    elif isinstance(field, ListField):
+        encoder = field_encoder(field.field)
+        return _list_converter(encoder) if encoder else None
+
+    elif isinstance(field, ForeignKeyField):
+        return attrgetter("key")
+
+    else:
+        return None
+
+def field_decoder(field):
+    """
+    Returns the function decoding the values of a field, or None if they
+    are stored as they are.
+    """
+    if isinstance(field, DateTimeField):
+        return decode_datetime
+
+    elif isinstance(field, ListField):
+        decoder = field_decoder(field.field)
+        return _list_converter(decoder) if decoder else None
+
+    elif isinstance(field, ForeignKeyField):
+        schema = field.schema
+        return lambda key: Proxy(key=key, schema=schema)
+
+    else:
+        return None
+
+
+class SchemaCodec:
+    """
+    Encodes and decodes the documents of a schema.
+
+    The field types are inspected once, when the codec is built: encoding
+    or decoding a document then only calls the converters of the fields
+    that need one, the other values being copied as they are.
+
+    The documents of schemas with indexed fields are written with the name
+    of their schema in TYPE_FIELD, for the views to tell them apart. The
+    documents of the other schemas are written as they were before.
+    """
+
+    def __init__(self, schema):
+        if any(field.indexed for field in schema.fields.values()):
+            self.type = schema.__name__
+        else:
+            self.type = None
+
+        self._encoders = {}
+        self._decoders = {}
+
+        for name, field in schema.fields.items():
+            encoder = field_encoder(field)
+            decoder = field_decoder(field)
+
+            if encoder is not None:
+                self._encoders[name] = encoder
+
+            if decoder is not None:
+                self._decoders[name] = decoder
+
+    def encode(self, data):
+        """
+        Returns the document of the entry data.
+        """
+        doc = dict(data)
+
+        for name, encoder in self._encoders.items():
+            if name in doc:
+                doc[name] = encoder(doc[name])
+
+        if self.type is not None:
+            doc[TYPE_FIELD] = self.type
+
+        return doc
+
+    def decode(self, doc):
+        """
+        Decodes a document, in place, and returns it.
+        """
+        doc.pop(TYPE_FIELD, None)
+
+        for name, decoder in self._decoders.items():
+            if name in doc:
+                doc[name] = decoder(doc[name])
+
+        return doc
+
+
+_codecs = WeakKeyDictionary()
+
+def schema_codec(schema):
+    """
+    Returns the codec of a schema, built on first use.
+    """
+    try:
+        return _codecs[schema]
+    except KeyError:
+        codec = _codecs[schema] = SchemaCodec(schema)
+        return codec
@@ -1,4 +1,6 @@
 
+from tornado.gen import coroutine
+
 from uzu.db.driver.couchbase.view import View
 
 class Design:
@@ -10,5 +12,25 @@ class Design:
         self._bucket = bucket
         self.name = name
 
-    def view(self, name):
-        return View(self, name)
\ No newline at end of file
+    def view(self, name, cache=None, **options):
+        return View(self, name, cache, **options)
+
+    @coroutine
+    def publish(self, views, username=None, password=None):
+        """
+        Creates or updates the design document, unless it already has the
+        same views. See Server.publish_design.
+
+        parameters:
+            views: a dict mapping the names of the views to dicts holding
+                their "map" function, and their "reduce" function, if any.
+        """
+        written = yield self._bucket._server.publish_design(
+            self._bucket.name,
+            self.name,
+            {"views": views},
+            username,
+            password
+        )
+
+        return written
\ No newline at end of file
@@ -0,0 +1,90 @@
+"""
+This file is part of Uzu.
+
+Uzu is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Uzu is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with Uzu.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import json
+
+from uzu.db.field import ListField
+from uzu.db.driver.couchbase.codec import TYPE_FIELD, field_encoder
+
+
+# The views only see the documents stored as plain JSON, with the schema
+# name in their TYPE_FIELD. Those stored by earlier versions, which did not
+# write it, are left out until they are stored again.
+
+def design_name(schema):
+    """
+    Returns the name of the design document indexing a schema.
+    """
+    return "uzu_" + schema.__name__.lower()
+
+def view_name(field_name):
+    """
+    Returns the name of the view indexing a field.
+    """
+    return "by_" + field_name
+
+def map_function(schema, field_name):
+    """
+    Returns the map function of the view indexing a field. The items of
+    list fields are indexed one by one.
+    """
+    value = "doc[{}]".format(json.dumps(field_name))
+    conditions = (
+        'meta.type == "json"',
+        "doc[{}] === {}".format(
+            json.dumps(TYPE_FIELD),
+            json.dumps(schema.__name__)
+        ),
+        "{} !== undefined".format(value)
+    )
+
+    if isinstance(schema.fields[field_name], ListField):
+        emit = (
+            "for (var i = 0; i < {0}.length; i++) {{ emit({0}[i], null); }}"
+        ).format(value)
+    else:
+        emit = "emit({}, null);".format(value)
+
+    return "function (doc, meta) {{ if ({}) {{ {} }} }}".format(
+        " && ".join(conditions),
+        emit
+    )
+
+def index_views(schema):
+    """
+    Returns the views of the indexed fields of a schema, as found in design
+    documents.
+    """
+    return {
+        view_name(name): {"map": map_function(schema, name)}
+        for name, field in sorted(schema.fields.items())
+        if field.indexed
+    }
+
+def index_key(field, value):
+    """
+    Returns the view key of a field value, for the view indexing the field.
+    """
+    if isinstance(field, ListField):
+        field = field.field
+
+    encoder = field_encoder(field)
+
+    if encoder is not None:
+        value = encoder(value)
+
+    return json.dumps(value)
@@ -0,0 +1,152 @@
+"""This file is part of Uzu.
+
+Uzu is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Uzu is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with Uzu.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import json
+import zlib
+
+from uzu.tools.structure import structure
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+
+class SerializerError(Exception):
+    pass
+
+
+# A serialization format. dumps turns a document into bytes, and loads turns
+# a bytes-like object back into a document.
+Format = structure("Format", ("name", "flags", "dumps", "loads"))
+
+# A compression, applied to the serialized documents above a size threshold.
+Compression = structure(
+    "Compression",
+    ("name", "flags", "compress", "decompress")
+)
+
+# The low byte of the memcached flags tells the format, the next one the
+# compression. Documents stored with flags 0 are plain JSON.
+FORMAT_MASK = 0x00FF
+COMPRESSION_MASK = 0xFF00
+
+formats = {}
+compressions = {}
+
+def register_format(name, flags, dumps, loads):
+    assert(flags == flags & FORMAT_MASK)
+    formats[name] = formats[flags] = Format(name, flags, dumps, loads)
+
+def register_compression(name, flags, compress, decompress):
+    assert(flags == flags & COMPRESSION_MASK)
+    compressions[name] = compressions[flags] = Compression(
+        name,
+        flags,
+        compress,
+        decompress
+    )
+
+
+def _json_dumps(doc):
+    return json.dumps(doc, separators=(",", ":")).encode()
+
+def _json_loads(value):
+    return json.loads(str(value, "utf-8"))
+
+register_format("json", 0x0000, _json_dumps, _json_loads)
+
+if msgpack is not None:
+    register_format(
+        "msgpack",
+        0x0001,
+        msgpack.packb,
+        lambda value: msgpack.unpackb(value, raw=False)
+    )
+
+register_compression("zlib", 0x0100, zlib.compress, zlib.decompress)
+
+if lz4 is not None:
+    register_compression(
+        "lz4",
+        0x0200,
+        lz4.frame.compress,
+        lz4.frame.decompress
+    )
+
+
+class Serializer:
+    """
+    Turns documents into memcached values and flags, and back.
+
+    Documents are written with the serializer format, and compressed when
+    they are larger than the threshold. They are read with the format and
+    the compression their flags tell, so a bucket can hold documents
+    written with different settings.
+
+    Attributes:
+        format: the name of the format documents are written with.
+        compression: the name of the compression, or None.
+        threshold: the size in bytes from which documents are compressed.
+    """
+
+    def __init__(self, format="json", compression=None, threshold=1024):
+        if format not in formats:
+            raise SerializerError("Unavailable format '{}'".format(format))
+
+        if compression is not None and compression not in compressions:
+            raise SerializerError(
+                "Unavailable compression '{}'".format(compression)
+            )
+
+        self.format = format
+        self.compression = compression
+        self.threshold = threshold
+
+        self._format = formats[format]
+        self._compression = compressions.get(compression)
+
+    def dumps(self, doc):
+        """
+        return: The value to store, and its flags.
+        """
+        value = self._format.dumps(doc)
+        flags = self._format.flags
+
+        if self._compression is not None and len(value) >= self.threshold:
+            value = self._compression.compress(value)
+            flags |= self._compression.flags
+
+        return value, flags
+
+    def loads(self, value, flags):
+        """
+        Decodes a stored value, a bytes-like object, according to its flags.
+        """
+        compression_flags = flags & COMPRESSION_MASK
+
+        try:
+            if compression_flags:
+                value = compressions[compression_flags].decompress(value)
+
+            return formats[flags & FORMAT_MASK].loads(value)
+        except KeyError:
+            raise SerializerError("Unknown flags 0x{:04x}".format(flags))
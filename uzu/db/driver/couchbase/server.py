@@ -4,20 +4,155 @@ import json
 from urllib.parse import urlunsplit
 
 from tornado.gen import coroutine
-from tornado.httpclient import AsyncHTTPClient
+from tornado.httpclient import HTTPRequest, HTTPError
+from tornado.simple_httpclient import SimpleAsyncHTTPClient
+
+try:
+    from tornado.curl_httpclient import CurlAsyncHTTPClient
+except ImportError:
+    CurlAsyncHTTPClient = None
 
 from uzu.db.driver.couchbase.bucket import Bucket
+from uzu.db.driver.couchbase.view import ViewQueue
+
+
+def create_http_client(max_clients=10, connect_timeout=20, request_timeout=20):
+    """
+    Returns an HTTP client of its own for the REST and view requests of a
+    server. It is curl based when pycurl is installed, as curl keeps the
+    connections alive.
+
+    parameters:
+        max_clients: the maximum number of concurrent requests.
+        connect_timeout: the connection timeout, in seconds.
+        request_timeout: the whole request timeout, in seconds.
+    """
+    client_class = CurlAsyncHTTPClient or SimpleAsyncHTTPClient
+
+    return client_class(
+        force_instance=True,
+        max_clients=max_clients,
+        defaults=dict(
+            connect_timeout=connect_timeout,
+            request_timeout=request_timeout
+        )
+    )
 
 
 class Server:
     """
     Couchbase Server
+
+    Attributes:
+        view_queue: the ViewQueue of the view requests, giving their metrics.
     """
 
-    def __init__(self, host="localhost"):
+    def __init__(
+        self,
+        host="localhost",
+        port=8091,
+        view_port=8092,
+        http_client=None,
+        max_view_requests=None
+    ):
+        """
+        parameters:
+            host: the host of a cluster node.
+            port: the REST port of the node.
+            view_port: the view port of the node.
+            http_client: the HTTP client of the REST and view requests.
+                Leave it blank for one made by create_http_client.
+            max_view_requests: the maximum number of concurrent view
+                requests, the others being queued, or None.
+        """
         self._host = host
+        self._port = port
+        self._view_port = view_port
+
+        if http_client is None:
+            http_client = create_http_client()
+
+        self._http_client = http_client
+        self.view_queue = ViewQueue(max_view_requests)
+
+    def bucket(
+        self,
+        name="default",
+        port=None,
+        cache=None,
+        serializer=None,
+        password=None,
+        **pool_options
+    ):
+        """
+        parameters:
+            name: the bucket name.
+            port: the memcached port of a proxy for the bucket. Leave it blank
+                to send requests straight to the cluster nodes.
+            cache: the LRUCache of the bucket entries.
+            serializer: the Serializer of the bucket documents.
+            password: the bucket password, the connections authenticate
+                with, be they to the servers or to the proxy.
+            pool_options: the MemcachedPool options, such as
+                max_connections.
+        """
+        return Bucket(
+            self,
+            name,
+            port,
+            cache,
+            serializer,
+            password,
+            **pool_options
+        )
+
+    @coroutine
+    def publish_design(
+        self,
+        bucket_name,
+        name,
+        document,
+        username=None,
+        password=None
+    ):
+        """
+        Creates or updates a design document, unless it already has the
+        same views.
+
+        parameters:
+            bucket_name: the name of the bucket of the design document.
+            name: the name of the design document.
+            document: the design document, as a dict holding its "views".
+            username, password: the credentials of the request, if needed.
+
+        return: True if the design document was written.
+        """
+        url = urlunsplit((
+            "http",
+            "{}:{}".format(self._host, self._view_port),
+            "{}/_design/{}".format(bucket_name, name),
+            None,
+            None
+        ))
+        auth = dict(auth_username=username, auth_password=password)
+
+        try:
+            response = yield self._http_client.fetch(HTTPRequest(url, **auth))
+        except HTTPError as error:
+            if error.code != 404:
+                raise
+        else:
+            current = json.loads(response.body.decode())
+
+            if current.get("views") == document.get("views"):
+                return False
 
-        self._http_client = AsyncHTTPClient()
+        yield self._http_client.fetch(HTTPRequest(
+            url,
+            method="PUT",
+            headers={"Content-Type": "application/json"},
+            body=json.dumps(document),
+            **auth
+        ))
 
-    def bucket(self, name="default", port=11211):
-        return Bucket(self, name, port)
+        return True
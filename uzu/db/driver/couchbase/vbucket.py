@@ -0,0 +1,72 @@
+"""
+This file is part of Uzu.
+
+Uzu is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Uzu is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with Uzu.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from zlib import crc32
+
+from uzu.tools.memcached import NotMyVbucketError
+
+
+class VbucketMap:
+    """
+    The vBucket map of a Couchbase bucket: which server is active for each
+    virtual bucket.
+
+    Attributes:
+        servers: the memcached servers of the bucket, as "host:port".
+    """
+
+    def __init__(self, config):
+        """
+        parameters:
+            config: the "vBucketServerMap" of the bucket configuration.
+        """
+        assert(config.get("hashAlgorithm", "CRC") == "CRC")
+
+        self.servers = list(config["serverList"])
+        self._masters = [
+            self.servers[chain[0]] if chain[0] >= 0 else None
+            for chain in config["vBucketMap"]
+        ]
+
+        # The number of vbuckets is a power of two.
+        self._mask = len(self._masters) - 1
+
+    def __len__(self):
+        return len(self._masters)
+
+    def vbucket_id(self, key):
+        """
+        Returns the virtual bucket of a key.
+        """
+        if isinstance(key, str):
+            key = key.encode()
+
+        return ((crc32(key) >> 16) & 0x7fff) & self._mask
+
+    def route(self, key):
+        """
+        Returns the server owning a key and the key's virtual bucket.
+        """
+        vbucket_id = self.vbucket_id(key)
+        server = self._masters[vbucket_id]
+
+        if server is None:
+            raise NotMyVbucketError(
+                "vbucket {} has no active server".format(vbucket_id)
+            )
+
+        return server, vbucket_id
@@ -1,28 +1,566 @@
-
+import re
 import json
 
+from time import monotonic
+from codecs import getincrementaldecoder
+from functools import partial
+from collections import deque
 from urllib.parse import urlunsplit, urlencode
 
 from tornado.gen import coroutine
+from tornado.concurrent import Future
+from tornado.httpclient import HTTPRequest, HTTPError
+
+from uzu.tools.cache import LRUCache
+
+
+class ViewError(Exception):
+    pass
+
+
+# The number of entries an EntryCursor fetches at once, unless the rows are
+# fetched by pages.
+BATCH_SIZE = 100
+
+
+class RowParser:
+    """
+    Incremental parser of view responses. The rows are decoded as soon as
+    they are fully received, the rest of the response once it is complete.
+
+    Attributes:
+        total_rows: the number of rows in the view.
+        errors: the errors reported by the nodes, if any.
+    """
+
+    _rows_start = re.compile(r'"rows"\s*:\s*\[')
+    _separator = re.compile(r"[\s,]*")
+
+    def __init__(self):
+        self._text = getincrementaldecoder("utf-8")()
+        self._decoder = json.JSONDecoder()
+        self._buffer = ""
+        self._header = None
+        self._finished = False
+
+        self.total_rows = None
+        self.errors = []
+
+    def feed(self, chunk):
+        """
+        Parses a chunk of the response.
+
+        return: The list of the rows completed by the chunk.
+        """
+        self._buffer += self._text.decode(chunk)
+        rows = []
+
+        if self._finished:
+            return rows
+
+        if self._header is None:
+            match = self._rows_start.search(self._buffer)
+
+            if match is None:
+                return rows
+
+            self._header = self._buffer[:match.start()]
+            self._buffer = self._buffer[match.end():]
+
+        position = 0
+
+        while True:
+            position = self._separator.match(self._buffer, position).end()
+
+            if position == len(self._buffer):
+                break
+
+            if self._buffer[position] == "]":
+                self._finished = True
+                position += 1
+                break
+
+            try:
+                row, position = self._decoder.raw_decode(
+                    self._buffer,
+                    position
+                )
+            except ValueError:
+                # The row is not fully received yet.
+                break
+
+            rows.append(row)
+
+        self._buffer = self._buffer[position:]
+
+        return rows
+
+    def close(self):
+        """
+        Parses what is left of the response, once it is fully received.
+        """
+        self._buffer += self._text.decode(b"", final=True)
+
+        try:
+            if self._header is None:
+                document = json.loads(self._buffer)
+            elif self._finished:
+                rest = self._header + '"rows":[]' + self._buffer
+                document = json.loads(rest)
+            else:
+                raise ViewError("Truncated view response")
+        except ValueError:
+            raise ViewError("Invalid view response")
+
+        if "rows" not in document:
+            raise ViewError(document.get("reason", "Invalid view response"))
+
+        self.total_rows = document.get("total_rows")
+        self.errors = document.get("errors", [])
+
+
+class Cursor:
+    """
+    The base class of the view cursors. They are iterated with fetch_next
+    in coroutines, or with "async for" with Python 3.5.
+    """
+
+    def __aiter__(self):
+        return self
+
+    def __anext__(self):
+        future = Future()
+
+        def on_fetched(fetched):
+            if fetched.exception() is not None:
+                future.set_exception(fetched.exception())
+            elif fetched.result():
+                future.set_result(self._next())
+            else:
+                future.set_exception(StopAsyncIteration())
+
+        self.fetch_next().add_done_callback(on_fetched)
+
+        return future
+
+
+class ViewCursor(Cursor):
+    """
+    Iterates over the rows of a view as they are received:
+
+        cursor = view.query(page_size=100)
+
+        while (yield cursor.fetch_next()):
+            row = cursor.next_row()
+
+    or, with Python 3.5, "async for row in cursor".
+
+    With a page size, the rows are fetched by pages of that size, each page
+    starting after the last row of the previous one (keyset pagination,
+    through startkey and startkey_docid). A page is only fetched once less
+    than a page of rows is left to read, so that at most two pages are held
+    in memory. This needs the rows to have an id, as reduced rows do not.
+
+    Attributes:
+        total_rows: the number of rows in the view, known once the first
+            page is received.
+        errors: the errors reported by the nodes.
+    """
+
+    def __init__(self, view, options, page_size=None):
+        self._view = view
+        self._options = options
+        self._page_size = page_size
+        self._limit = options.pop("limit", None)
+
+        self._rows = deque()
+        self._waiter = None
+        self._drained = None
+        self._run_future = None
+
+        self.total_rows = None
+        self.errors = []
+
+    def _push(self, row):
+        self._rows.append(row)
+        self._wake()
+
+    def _wake(self, future=None):
+        waiter, self._waiter = self._waiter, None
+
+        if waiter is not None:
+            if future is not None and future.exception() is not None:
+                waiter.set_exception(future.exception())
+            else:
+                waiter.set_result(bool(self._rows))
+
+    @coroutine
+    def _stream(self, options, page):
+        """
+        Streams a page of rows.
+
+        return: The number of rows received, and the first row of the next
+            page, if any.
+        """
+        parser = RowParser()
+        count = 0
+        next_row = None
+
+        def on_chunk(chunk):
+            nonlocal count, next_row
+
+            for row in parser.feed(chunk):
+                if self._page_size and count == page:
+                    next_row = row
+                else:
+                    count += 1
+                    self._push(row)
+
+        request = HTTPRequest(
+            self._view._url(options),
+            streaming_callback=on_chunk
+        )
+
+        try:
+            yield self._view._fetch_url(request)
+        except HTTPError:
+            # Raises the reason given by the server, if any.
+            parser.close()
+            raise
+
+        parser.close()
+
+        if self.total_rows is None:
+            self.total_rows = parser.total_rows
+
+        self.errors.extend(parser.errors)
+
+        return count, next_row
+
+    @coroutine
+    def _run(self):
+        options = dict(self._options)
+        remaining = self._limit
+
+        while True:
+            page = self._page_size
+
+            if remaining is not None:
+                page = remaining if page is None else min(page, remaining)
+
+            if page is not None:
+                # One more row gives the start of the next page.
+                options["limit"] = page + 1 if self._page_size else page
+
+            count, next_row = yield self._stream(options, page)
+
+            if remaining is not None:
+                remaining -= count
+
+            if next_row is None or remaining == 0:
+                break
+
+            options["startkey"] = json.dumps(next_row["key"])
+            options["startkey_docid"] = next_row["id"]
+            options.pop("skip", None)
+
+            # Waits for the rows to be read before fetching more of them.
+            if len(self._rows) >= self._page_size:
+                self._drained = Future()
+                yield self._drained
+
+    def fetch_next(self):
+        """
+        return: A future resolved with True when a row is ready to be read
+            with next_row, or with False when there is no row left.
+        """
+        if self._run_future is None:
+            self._run_future = self._run()
+            self._run_future.add_done_callback(self._wake)
+
+        future = Future()
+        run = self._run_future
+
+        if self._rows:
+            future.set_result(True)
+        elif run.done():
+            if run.exception() is not None:
+                future.set_exception(run.exception())
+            else:
+                future.set_result(False)
+        else:
+            self._waiter = future
+
+        return future
+
+    def next_row(self):
+        row = self._rows.popleft()
+
+        if self._drained is not None and len(self._rows) < self._page_size:
+            drained, self._drained = self._drained, None
+            drained.set_result(None)
+
+        return row
+
+    _next = next_row
+
+
+class EntryCursor(Cursor):
+    """
+    Iterates over the entries of the rows of a view. The documents of each
+    batch of rows are fetched together, with a single multi-get.
+    """
+
+    def __init__(self, rows, schema, batch_size, refresh_cache):
+        self._rows = rows
+        self._schema = schema
+        self._batch_size = batch_size
+        self._refresh_cache = refresh_cache
+
+        self._entries = deque()
+
+    @coroutine
+    def fetch_next(self):
+        """
+        See ViewCursor.fetch_next.
+        """
+        while not self._entries:
+            keys = []
+
+            while (
+                len(keys) < self._batch_size
+                and (yield self._rows.fetch_next())
+            ):
+                keys.append(self._rows.next_row()["id"])
+
+            if not keys:
+                return False
+
+            bucket = self._rows._view._design._bucket
+            entries = yield bucket.load_many(
+                keys,
+                self._schema,
+                self._refresh_cache
+            )
+
+            # The documents removed since they were indexed are skipped.
+            self._entries.extend(
+                entries[key] for key in keys if key in entries
+            )
+
+        return True
+
+    def next_entry(self):
+        return self._entries.popleft()
+
+    _next = next_entry
+
+
+class ViewQueue:
+    """
+    Sends the view requests of a server, up to max_concurrency at once, and
+    measures them.
+
+    Attributes:
+        max_concurrency: the maximum number of concurrent view requests, or
+            None.
+        active: the number of requests being sent.
+        queued: the number of requests waiting for their turn.
+    """
+
+    def __init__(self, max_concurrency=None):
+        self.max_concurrency = max_concurrency
+        self.active = 0
+
+        self._waiters = deque()
+
+        self._requests = 0
+        self._errors = 0
+        self._wait_time = 0.0
+        self._latency = 0.0
+        self._max_latency = 0.0
+
+    @property
+    def queued(self):
+        return len(self._waiters)
+
+    def _acquire(self):
+        future = Future()
+
+        if self.max_concurrency is None or self.active < self.max_concurrency:
+            self.active += 1
+            future.set_result(None)
+        else:
+            self._waiters.append(future)
+
+        return future
+
+    def _release(self):
+        if self._waiters:
+            self._waiters.popleft().set_result(None)
+        else:
+            self.active -= 1
+
+    @coroutine
+    def fetch(self, http_client, request):
+        """
+        Sends a request with the HTTP client once a slot is free.
+        """
+        queued = monotonic()
+        yield self._acquire()
+        started = monotonic()
+
+        try:
+            response = yield http_client.fetch(request)
+        except Exception:
+            self._errors += 1
+            raise
+        finally:
+            self._release()
+
+            latency = monotonic() - started
+            self._requests += 1
+            self._wait_time += started - queued
+            self._latency += latency
+            self._max_latency = max(self._max_latency, latency)
+
+        return response
+
+    def stats(self):
+        """
+        return: A dict of the queue metrics. The times are in seconds, the
+            latency excluding the time spent in the queue.
+        """
+        requests = self._requests or 1
+
+        return {
+            "active": self.active,
+            "queued": self.queued,
+            "requests": self._requests,
+            "errors": self._errors,
+            "mean_wait_time": self._wait_time / requests,
+            "mean_latency": self._latency / requests,
+            "max_latency": self._max_latency
+        }
+
+
+class ViewCache:
+    """
+    Caches the rows of view queries, by view and query options. Concurrent
+    identical queries share a single request.
+
+    Past their ttl, cached rows may still be served for stale_ttl seconds
+    while they are fetched again in the background. The rows are shared by
+    the callers, which must not modify them.
+
+    Attributes:
+        ttl: how long the rows are fresh, in seconds.
+        stale_ttl: how long the rows are served once they are not fresh,
+            in seconds.
+    """
+
+    def __init__(self, max_entries=1000, max_rows=None, ttl=60, stale_ttl=0):
+        """
+        parameters:
+            max_entries: the maximum number of cached queries.
+            max_rows: the maximum number of cached rows, or None.
+        """
+        self._cache = LRUCache(
+            max_entries=max_entries,
+            max_size=max_rows,
+            ttl=ttl + stale_ttl
+        )
+        self._pending = {}
+
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+
+    @coroutine
+    def _fetch(self, key, fetch):
+        try:
+            rows = yield fetch()
+        finally:
+            self._pending.pop(key, None)
+
+        self._cache.set(key, (rows, monotonic()), len(rows))
+
+        return rows
+
+    def _refresh(self, key, fetch):
+        future = self._pending.get(key)
+
+        if future is None:
+            future = self._fetch(key, fetch)
+
+            # A fetch may complete at once, and is then not pending.
+            if not future.done():
+                self._pending[key] = future
+
+        return future
+
+    def get(self, key, fetch):
+        """
+        parameters:
+            key: the key of the query.
+            fetch: a function starting the query, and returning a future
+                resolved with its rows.
+
+        return: A future resolved with the rows.
+        """
+        cached = self._cache.get(key)
+
+        if cached is None:
+            return self._refresh(key, fetch)
+
+        rows, fetched = cached
+
+        if monotonic() - fetched >= self.ttl:
+            # The failures of background refreshes are dropped: the stale
+            # rows are served until the next attempt.
+            refresh = self._refresh(key, fetch)
+            refresh.add_done_callback(lambda future: future.exception())
+
+        future = Future()
+        future.set_result(rows)
+
+        return future
+
+    def clear(self):
+        self._cache.clear()
+
+    def stats(self):
+        """
+        See LRUCache.stats.
+        """
+        return self._cache.stats()
+
 
 class View:
     """
     Couchbase view
+
+    The results of execute are cached by the ViewCache given to the view,
+    or else by the "view_cache" of its bucket, if it has one.
     """
 
-    def __init__(self, design, name, **options):
+    def __init__(self, design, name, cache=None, **options):
         self._design = design
         self.name = name
         self._options = options
 
-        self._http_client = self._design._bucket._server._http_client
-        self._server = (self._design._bucket._server._host, "8092")
+        if cache is None:
+            cache = getattr(self._design._bucket, "view_cache", None)
 
-    @coroutine
-    def execute(self, **options):
-        options.update(self._options)
+        self._cache = cache
+
+        server = self._design._bucket._server
+
+        self._http_client = server._http_client
+        self._queue = server.view_queue
+        self._server = (server._host, str(server._view_port))
 
-        url = urlunsplit((
+    def _url(self, options):
+        return urlunsplit((
             "http",
             ":".join(self._server),
             "{bucket}/_design/{design}/_view/{name}".format(
@@ -34,7 +572,68 @@ class View:
             None
         ))
 
-        response = yield self._http_client.fetch(url)
+    def _fetch_url(self, request):
+        return self._queue.fetch(self._http_client, request)
 
+    @coroutine
+    def _fetch(self, options):
+        response = yield self._fetch_url(self._url(options))
         return json.loads(response.body.decode())["rows"]
 
+    @coroutine
+    def execute(self, **options):
+        options.update(self._options)
+
+        if self._cache is None:
+            rows = yield self._fetch(options)
+        else:
+            key = (
+                self._design._bucket.name,
+                self._design.name,
+                self.name,
+                urlencode(sorted(options.items()))
+            )
+            rows = yield self._cache.get(key, partial(self._fetch, options))
+
+        return rows
+
+    def query(self, page_size=None, **options):
+        """
+        Queries the view without holding its whole response in memory.
+
+        parameters:
+            page_size: the number of rows to fetch at once. Leave it blank to
+                get all the rows with a single request.
+            options: the view query options, as for execute.
+
+        return: A ViewCursor over the rows.
+        """
+        options.update(self._options)
+
+        return ViewCursor(self, options, page_size)
+
+    def entries(
+        self,
+        schema,
+        page_size=BATCH_SIZE,
+        refresh_cache=False,
+        **options
+    ):
+        """
+        Queries the view for the entries of its rows, rather than for the
+        rows themselves.
+
+        parameters:
+            schema: the schema of the entries.
+            page_size: the number of rows, and of entries, to fetch at once.
+                With None, the rows are fetched with a single request, and
+                the entries by batches of BATCH_SIZE.
+            refresh_cache: whether the cached entries are fetched again.
+            options: the view query options, as for execute.
+
+        return: An EntryCursor over the entries.
+        """
+        rows = self.query(page_size, **options)
+        batch_size = page_size or BATCH_SIZE
+
+        return EntryCursor(rows, schema, batch_size, refresh_cache)
@@ -17,9 +17,22 @@ along with Uzu.  If not, see <http://www.gnu.org/licenses/>.
 
 import re
 
+from math import isnan
 from datetime import datetime, timezone
 from collections import Sequence, Mapping
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+inf = float("inf")
+
+# The length from which sequences are validated in bulk rather than value
+# by value.
+BULK_THRESHOLD = 64
+
 
 class FieldError(Exception):
     pass
@@ -32,24 +45,73 @@ class Field(object):
     Attributes:
         required: A boolean that indicate if the field is required.
         default: The default value of this field.
+        indexed: A boolean that indicate if the entries are looked up by
+            this field, for the drivers to index it.
+        mutable: A boolean that indicate if the values of the field may
+            change in place.
     """
 
-    def __init__(self, required=False, default=None):
+    mutable = False
+
+    def __init__(self, required=False, default=None, indexed=False):
         self.required = required
         self.default = default
+        self.indexed = indexed
+
+    def validator(self):
+        """
+        Returns a function testing values the way is_valid does. The field
+        settings are read once, when it is built.
+
+        A value can not be None, even in a field that is not required.
+        """
+        kind = self._type
 
-    def _required_test(self, value):
-        return not (self.required and value is None)
+        def check(value):
+            return isinstance(value, kind)
 
-    def _type_test(self, value):
-        return isinstance(value, self._type)
+        return check
+
+    def _checker(self):
+        try:
+            return self._check
+        except AttributeError:
+            check = self._check = self.validator()
+            return check
 
     def is_valid(self, value):
         """
-        Test if the field is required and filled.
-        Do not test anything if the field is not required
+        Test if the value fits the field.
+        """
+        return self._checker()(value)
+
+    def error(self, value):
+        """
+        Returns the name of the rule the value breaks, or None if it is
+        valid.
+        """
+        if not isinstance(value, self._type):
+            return "type"
+
+        return None
+
+    def _all_valid(self, values):
+        return all(map(self._checker(), values))
+
+    def validate_many(self, values):
+        """
+        Validates a sequence of values at once.
+
+        return: A list of (index, rule) pairs, one for each invalid value.
         """
-        return self._required_test(value) and self._type_test(value)
+        check = self._checker()
+        error = self.error
+
+        return [
+            (index, error(value))
+            for index, value in enumerate(values)
+            if not check(value)
+        ]
 
 
 #================#
@@ -65,38 +127,110 @@ class NumericField(Field):
         max: the maximum value of the field.
     """
 
-    def __init__(self, min=None, max=None, required=False, default=None):
-        super().__init__(required=required, default=default)
+    def __init__(
+        self,
+        min=None,
+        max=None,
+        required=False,
+        default=None,
+        indexed=False
+    ):
+        super().__init__(required=required, default=default, indexed=indexed)
 
         self.min = min
         self.max = max
 
-    def _range_test(self, value):
-        min_test = (
-            self.min is None
-            or (self.min is not None and (self.min < value))
-        )
+    def validator(self):
+        if self.min is None and self.max is None:
+            return super().validator()
+
+        kind = self._type
+        low = -inf if self.min is None else self.min
+        high = inf if self.max is None else self.max
+
+        def check(value):
+            return isinstance(value, kind) and low < value < high
+
+        return check
+
+    def error(self, value):
+        rule = super().error(value)
+
+        if rule is None:
+            if self.min is not None and not self.min < value:
+                rule = "min"
+            elif self.max is not None and not value < self.max:
+                rule = "max"
+
+        return rule
+
+    def _all_valid(self, values):
+        """
+        Checks the types of the values, then their bounds with min and max,
+        rather than each value in turn.
+        """
+        if len(values) < BULK_THRESHOLD:
+            return super()._all_valid(values)
+
+        kind = self._type
+        types = set(map(type, values))
+
+        if not all(issubclass(type_, kind) for type_ in types):
+            return False
 
-        max_test = (
-            self.max is None
-            or (self.max is not None and (value < self.max))
+        if self.min is None and self.max is None:
+            return True
+
+        # NaN compares false with anything, min and max may skip it.
+        if kind is float and isnan(sum(values)):
+            return super()._all_valid(values)
+
+        return (
+            (self.min is None or self.min < min(values))
+            and (self.max is None or max(values) < self.max)
         )
 
-        return min_test and max_test
+    def _validate_array(self, array):
+        if array.dtype.kind not in self._kinds:
+            return super().validate_many(array.tolist())
 
-    def is_valid(self, value):
-        return super().is_valid(value) and self._range_test(value)
+        errors = {}
+
+        if self.max is not None:
+            for index in numpy.flatnonzero(~(array < self.max)).tolist():
+                errors[index] = "max"
+
+        if self.min is not None:
+            for index in numpy.flatnonzero(~(array > self.min)).tolist():
+                errors[index] = "min"
+
+        return sorted(errors.items())
+
+    def validate_many(self, values):
+        """
+        See Field.validate_many. NumPy arrays are checked as a whole, their
+        dtype standing for the type of their values.
+        """
+        if numpy is not None and isinstance(values, numpy.ndarray):
+            return self._validate_array(values)
+
+        if self._all_valid(values):
+            return []
+
+        return super().validate_many(values)
 
 class IntegerField(NumericField):
     """An integer field."""
 
     _type = int
+    _kinds = "biu"
 
 
 class FloatField(NumericField):
     """A float field."""
 
     _type = float
+    _kinds = "f"
 
 
 #===============#
@@ -121,9 +255,10 @@ class StringField(Field):
         max_length=None,
         pattern=None,
         required=False,
-        default=None
+        default=None,
+        indexed=False
     ):
-        super().__init__(required=required, default=default)
+        super().__init__(required=required, default=default, indexed=indexed)
 
         self.min_length = min_length
         self.max_length = max_length
@@ -139,39 +274,35 @@ class StringField(Field):
         else:
             self.pattern = None
 
-    def _length_test(self, value):
-        min_length_test = (
-            self.min_length is None
-            or (
-                self.min_length is not None
-                and (self.min_length < len(value))
+    def validator(self):
+        kind = self._type
+        low = -1 if self.min_length is None else self.min_length
+        high = inf if self.max_length is None else self.max_length
+        match = self.pattern.match if self.pattern else None
+
+        def check(value):
+            return (
+                isinstance(value, kind)
+                and low < len(value) < high
+                and (match is None or match(value) is not None)
             )
-        )
 
-        max_length_test = (
-            self.max_length is None
-            or (
-                self.max_length is not None
-                and (len(value) < self.max_length)
-            )
-        )
+        return check
 
-        return min_length_test and max_length_test
+    def error(self, value):
+        rule = super().error(value)
 
-    def _pattern_test(self, value):
-        return (
-            self.pattern is None
-            or (
-                self._pattern is not None
-                and bool(self._pattern.match(value))
-            )
-        )
+        if rule is None:
+            length = len(value)
 
-    def is_valid(self, value):
-        return (
-            super().is_valid(value)
-            and (self._length_test(value) and self._pattern_test(value))
-        )
+            if self.min_length is not None and not self.min_length < length:
+                rule = "min_length"
+            elif self.max_length is not None and not length < self.max_length:
+                rule = "max_length"
+            elif self.pattern is not None and not self.pattern.match(value):
+                rule = "pattern"
+
+        return rule
 
 
 #======================#
@@ -184,14 +315,24 @@ class DateTimeField(Field):
 
     Attributes:
         auto_now: fill the field with the current date by default.
+        epoch: store the date as an integer number of microseconds since
+            the epoch, rather than as an ISO 8601 string.
     """
 
     _type = datetime
 
-    def __init__(self, auto_now=False, required=False, default=None):
-        super().__init__(required=required, default=default)
+    def __init__(
+        self,
+        auto_now=False,
+        epoch=False,
+        required=False,
+        default=None,
+        indexed=False
+    ):
+        super().__init__(required=required, default=default, indexed=indexed)
 
         self.auto_now = auto_now
+        self.epoch = epoch
 
     @property
     def default(self):
@@ -218,17 +359,35 @@ class ListField(Field):
     """
 
     _type = list
+    mutable = True
 
-    def __init__(self, field, required=False, default=None):
-        super().__init__(required=required, default=default)
+    def __init__(self, field, required=False, default=None, indexed=False):
+        super().__init__(required=required, default=default, indexed=indexed)
 
         if not isinstance(field, Field):
             raise FieldError("'field' argument must be a Field instance")
 
         self.field = field
 
-    def is_valid(self, value):
-        return (
-            super().is_valid()
-            and all(self.field.is_valid(v) for v in value)
-        )
+    def validator(self):
+        kind = self._type
+        check_item = self.field.validator()
+        all_valid = self.field._all_valid
+
+        def check(value):
+            if not isinstance(value, kind):
+                return False
+            elif len(value) < BULK_THRESHOLD:
+                return all(map(check_item, value))
+            else:
+                return all_valid(value)
+
+        return check
+
+    def error(self, value):
+        rule = super().error(value)
+
+        if rule is None and not self.field._all_valid(value):
+            rule = "items"
+
+        return rule
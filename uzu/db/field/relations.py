@@ -34,9 +34,9 @@ class ForeignKeyField(RelationField):
 
     _type = (Schema, Proxy)
 
-    def __init__(self, schema, required=False, default=None):
+    def __init__(self, schema, required=False, default=None, indexed=False):
         assert(issubclass(schema, Schema))
 
-        super().__init__(required=required, default=default)
+        super().__init__(required=required, default=default, indexed=indexed)
 
         self.schema = schema
@@ -16,21 +16,52 @@ along with Uzu.  If not, see <http://www.gnu.org/licenses/>.
 """
 
 from abc import ABCMeta
+from copy import copy
+from collections import OrderedDict
 from collections.abc import MutableMapping
 from types import new_class
 
 from tornado.gen import coroutine
 
-from uzu.tools.structure import structure
+from uzu.tools.structure import structure, mapping_structure
 from uzu.db.driver import Driver
 
 
 class SchemaError(Exception):
-    pass
+    """
+    Attributes:
+        errors: the Violations of the fields, when an entry is not valid.
+    """
+
+    def __init__(self, message, errors=()):
+        super().__init__(message)
+        self.errors = list(errors)
+
+
+# A rule broken by the value of a field.
+Violation = structure("Violation", ("field", "rule", "value"))
+
+
+# The dirty fields of a clean entry, shared to spare a set per entry.
+_clean = frozenset()
+
+# The saved values of the mutable fields of an entry never marked clean, or
+# without mutable fields. It is shared too, and never modified.
+_unsaved = {}
 
 
 class MetaSchema(ABCMeta):
 
+    def __new__(mcs, name, bases, namespace):
+        # Compact schemas get slots, and the driver's meta slot once.
+        inherited = any(getattr(base, "compact", False) for base in bases)
+        compact = namespace.get("compact", inherited)
+
+        if compact and "__slots__" not in namespace:
+            namespace["__slots__"] = () if inherited else ("meta",)
+
+        return super().__new__(mcs, name, bases, namespace)
+
     def __init__(cls, name, bases, namespace):
         fields = {}
 
@@ -42,26 +73,55 @@ class MetaSchema(ABCMeta):
 
         cls.fields = fields
 
+        # The validation plan, built once for the schema.
+        cls._required = tuple(
+            name for name, field in fields.items() if field.required
+        )
+        cls._validators = {
+            name: field.validator() for name, field in fields.items()
+        }
+
+        # The fields whose values may change in place, as lists do.
+        cls._mutable = tuple(
+            name for name, field in fields.items() if field.mutable
+        )
+
+        if cls.compact:
+            cls._storage = mapping_structure(name + "Data", fields)
+
 
 class Schema(MutableMapping, metaclass=MetaSchema):
     """
     The base class to all schemas. its role is to hold data.
+
+    A schema setting "compact" to True gets compact entries: they hold
+    their data in slots generated from the schema fields instead of a dict,
+    and they have no instance dict either as long as their bases are
+    compact schemas, or Schema itself.
     """
 
+    __slots__ = ("_data", "_dirty", "_saved")
+
+    compact = False
+    _storage = dict
+
     def __init__(self, *args, **kwargs):
         if args and len(args) == 1:
-            self._data = dict(args[0])
+            self._data = self._storage(args[0])
         else:
-            self._data = kwargs
-
-        for name in self.required_fields():
-            field = self.fields[name]
+            self._data = self._storage(kwargs)
 
+        for name in self._required:
             if name not in self._data:
-                if not field.default:
+                default = self.fields[name].default
+
+                if not default:
                     raise SchemaError("required field must be filled")
 
-                self._data[name] = field.default
+                self._data[name] = default
+
+        self._dirty = set(self._data) or _clean
+        self._saved = _unsaved
 
     # Classmethods
 
@@ -71,7 +131,7 @@ class Schema(MutableMapping, metaclass=MetaSchema):
 
     @classmethod
     def required_fields(cls):
-        return filter(lambda name: cls.fields[name].required, cls.fields)
+        return cls._required
 
     # Mixins
 
@@ -94,6 +154,7 @@ class Schema(MutableMapping, metaclass=MetaSchema):
         if name in self.fields:
             if value is not None:
                 self._data[name] = value
+                self.mark_dirty(name)
             else:
                 raise SchemaError("A field can not be set to None")
         else:
@@ -105,12 +166,123 @@ class Schema(MutableMapping, metaclass=MetaSchema):
             raise SchemaError(msg)
 
         del self._data[name]
+        self.mark_dirty(name)
 
+    # Changes tracking
+
+    @property
+    def dirty_fields(self):
+        """
+        The fields modified since the entry was last loaded or stored. The
+        fields holding mutable values, such as lists, are included when
+        their values differ from the copies made when they were saved, as
+        they may have changed in place.
+        """
+        data = self._data
+        dirty = self._dirty
+        saved = self._saved
+        changed = [
+            name for name in self._mutable
+            if name in data
+            and name not in dirty
+            and data[name] != saved.get(name)
+        ]
+
+        return frozenset(dirty.union(changed) if changed else dirty)
+
+    def mark_dirty(self, *names):
+        """
+        Marks fields as modified.
+        """
+        if self._dirty is _clean:
+            self._dirty = set(names)
+        else:
+            self._dirty.update(names)
+
+    def mark_clean(self, *names):
+        """
+        Marks fields, or all of them, as saved. The values of the mutable
+        fields are copied, to tell whether they changed in place since.
+        """
+        if names and self._dirty is not _clean:
+            self._dirty.difference_update(names)
+
+        if not names or not self._dirty:
+            self._dirty = _clean
+
+        if self._mutable:
+            data = self._data
+
+            if self._saved is _unsaved:
+                self._saved = {}
+
+            for name in self._mutable:
+                if names and name not in names:
+                    continue
+
+                if name in data:
+                    self._saved[name] = copy(data[name])
+                else:
+                    self._saved.pop(name, None)
 
     # Validation
-    
+
     def is_valid(self):
-        return all(self.fields[name].is_valid(self[name]) for name in self)
+        validators = self._validators
+
+        for name, value in self._data.items():
+            if not validators[name](value):
+                return False
+
+        return True
+
+    def errors(self):
+        """
+        Validates the entry in a single pass. The rule broken by an invalid
+        value is only looked for once the value failed its validator.
+
+        return: A list of Violations, empty if the entry is valid.
+        """
+        validators = self._validators
+        errors = []
+
+        for name, value in self._data.items():
+            if not validators[name](value):
+                rule = self.fields[name].error(value)
+                errors.append(Violation(name, rule, value))
+
+        return errors
+
+    @classmethod
+    def validate_many(cls, entries):
+        """
+        Validates a sequence of entries, or of mappings, at once. The values
+        of each field are gathered and checked together.
+
+        return: A dict mapping the indexes of the invalid entries to lists of
+            Violations.
+        """
+        reports = {}
+
+        for name, field in cls.fields.items():
+            indexes = []
+            values = []
+
+            for index, entry in enumerate(entries):
+                value = entry.get(name)
+
+                if value is not None:
+                    indexes.append(index)
+                    values.append(value)
+                elif field.required:
+                    violation = Violation(name, "required", None)
+                    reports.setdefault(index, []).append(violation)
+
+            for n, rule in field.validate_many(values):
+                violation = Violation(name, rule, values[n])
+                reports.setdefault(indexes[n], []).append(violation)
+
+        return reports
 
     def __eq__(self, other):
         """
@@ -159,6 +331,11 @@ class Proxy:
 
 class DrivedMixin:
 
+    __slots__ = ()
+
+    # How long the driver may cache the entries, in seconds.
+    cache_ttl = None
+
     @property
     def key(self):
         return self.meta.key
@@ -169,14 +346,47 @@ class DrivedMixin:
         entry = yield cls.driver.load(key, cls)
         return entry
 
+    @classmethod
+    @coroutine
+    def load_many(cls, keys, refresh_cache=True):
+        entries = yield cls.driver.load_many(keys, cls, refresh_cache)
+        return entries
+
+    @classmethod
+    def lookup(cls, field_name, value, **options):
+        """
+        Returns an iterator over the entries whose indexed field holds
+        value. See the lookup method of the driver.
+        """
+        return cls.driver.lookup(cls, field_name, value, **options)
+
+    @classmethod
+    @coroutine
+    def resolve(cls, entries, depth=1):
+        """
+        See the resolve function.
+        """
+        yield resolve(entries, depth)
+
     @coroutine
     def reload(self):
         yield self.driver.reload(self)
 
     @coroutine
     def store(self):
-        if not self.is_valid():
-            raise SchemaError("Schema not valid")
+        """
+        Stores the entry, unless it is already stored and unchanged.
+        """
+        if getattr(self, "meta", None) is not None and not self.dirty_fields:
+            return
+
+        errors = self.errors()
+
+        if errors:
+            message = "Schema not valid: " + ", ".join(
+                "{} ({})".format(error.field, error.rule) for error in errors
+            )
+            raise SchemaError(message, errors)
 
         yield self.driver.store(self)
 
@@ -185,6 +395,73 @@ class DrivedMixin:
         yield self.driver.remove(self)
 
 
+def _replace_proxies(entry, loaded):
+    """
+    Replaces the proxies of an entry with the loaded entries they reference.
+    """
+    for name, value in list(entry._data.items()):
+        if isinstance(value, Proxy):
+            entry._data[name] = loaded.get((value.schema, value.key), value)
+
+        elif isinstance(value, list):
+            for n, item in enumerate(value):
+                if isinstance(item, Proxy):
+                    value[n] = loaded.get((item.schema, item.key), item)
+
+
+@coroutine
+def resolve(entries, depth=1):
+    """
+    Replaces the proxies held by the entries, directly or in lists, with the
+    entries they reference, and so on for the entries loaded, up to "depth"
+    levels.
+
+    The graph is walked breadth first: the distinct keys of a level are
+    loaded with one load_many per schema, and entries already held by the
+    drivers are not fetched again.
+    """
+    loaded = {}
+    level = list(entries)
+
+    for n in range(depth):
+        wanted = OrderedDict()
+
+        for entry in level:
+            for value in entry.values():
+                items = value if isinstance(value, list) else (value,)
+
+                for item in items:
+                    if (
+                        isinstance(item, Proxy)
+                        and (item.schema, item.key) not in loaded
+                        and issubclass(item.schema, DrivedMixin)
+                    ):
+                        keys = wanted.setdefault(item.schema, OrderedDict())
+                        keys[item.key] = None
+
+        results = yield [
+            schema.load_many(list(keys), refresh_cache=False)
+            for schema, keys in wanted.items()
+        ]
+
+        next_level = []
+
+        for schema, result in zip(wanted, results):
+            for key, entry in result.items():
+                loaded[schema, key] = entry
+                next_level.append(entry)
+
+        # The proxies to entries loaded at an earlier level, as in cycles,
+        # are replaced too.
+        for entry in level:
+            _replace_proxies(entry, loaded)
+
+        if not next_level:
+            break
+
+        level = next_level
+
+
 def drived(driver):
     def decorator(cls):
         assert isinstance(driver, Driver)
@@ -0,0 +1,145 @@
+"""
+This file is part of Uzu.
+
+Uzu is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Uzu is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with Uzu.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from time import monotonic
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    A least recently used cache.
+
+    The cache is bounded by its number of items and/or by the total size of
+    its items, and each item can expire after a time to live.
+
+    Attributes:
+        max_entries: the maximum number of items, or None.
+        max_size: the maximum total size of the items, or None.
+        ttl: the default time to live of the items in seconds, or None.
+        size: the total size of the items.
+        hits: how many lookups found an item.
+        misses: how many lookups found nothing.
+        evictions: how many items were dropped to respect the bounds.
+        expirations: how many items were dropped because they expired.
+    """
+
+    def __init__(self, max_entries=None, max_size=None, ttl=None):
+        self.max_entries = max_entries
+        self.max_size = max_size
+        self.ttl = ttl
+
+        # key -> (value, size, expiration time)
+        self._items = OrderedDict()
+        self.size = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        """
+        Tells if a key is cached, without counting a lookup.
+        """
+        item = self._items.get(key)
+        return item is not None and not self._expired(key, item)
+
+    def _expired(self, key, item):
+        value, size, expires = item
+
+        if expires is not None and expires <= monotonic():
+            self._remove(key)
+            self.expirations += 1
+            return True
+
+        return False
+
+    def _remove(self, key):
+        value, size, expires = self._items.pop(key)
+        self.size -= size
+
+        return value
+
+    def get(self, key, default=None):
+        """
+        Returns the value of a key, and marks it as recently used.
+        """
+        item = self._items.get(key)
+
+        if item is None or self._expired(key, item):
+            self.misses += 1
+            return default
+
+        self._items.move_to_end(key)
+        self.hits += 1
+
+        return item[0]
+
+    def set(self, key, value, size=0, ttl=None):
+        """
+        Caches a value, evicting the least recently used items if needed.
+
+        parameters:
+            key: the key of the value.
+            value: the value to cache.
+            size: the size of the value, counted against max_size.
+            ttl: the time to live of the value, instead of the default one.
+        """
+        if key in self._items:
+            self._remove(key)
+
+        if ttl is None:
+            ttl = self.ttl
+
+        expires = monotonic() + ttl if ttl is not None else None
+
+        self._items[key] = (value, size, expires)
+        self.size += size
+
+        while len(self._items) > 1 and (
+            (self.max_entries is not None
+                and len(self._items) > self.max_entries)
+            or (self.max_size is not None and self.size > self.max_size)
+        ):
+            self._remove(next(iter(self._items)))
+            self.evictions += 1
+
+    def pop(self, key, default=None):
+        """
+        Removes a key and returns its value.
+        """
+        if key in self._items:
+            return self._remove(key)
+
+        return default
+
+    def clear(self):
+        self._items.clear()
+        self.size = 0
+
+    def stats(self):
+        return {
+            "entries": len(self._items),
+            "size": self.size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations
+        }
@@ -0,0 +1,107 @@
+"""
+This file is part of Uzu.
+
+Uzu is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Uzu is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with Uzu.  If not, see <http://www.gnu.org/licenses/>.
+
+A consistent hash ring compatible with libketama.
+"""
+
+from bisect import bisect_left
+from hashlib import md5
+from math import floor
+from struct import Struct
+from collections.abc import Mapping
+
+
+_float = Struct("f")
+
+def _single(value):
+    """
+    Rounds a number to single precision, as libketama computes the shares
+    of the nodes with C floats.
+    """
+    return _float.unpack(_float.pack(value))[0]
+
+
+def _points(digest):
+    """
+    Yields the four 32 bits points of a md5 digest, as libketama does.
+    """
+    for h in range(4):
+        yield (
+            (digest[3 + h * 4] << 24)
+            | (digest[2 + h * 4] << 16)
+            | (digest[1 + h * 4] << 8)
+            | digest[h * 4]
+        )
+
+def ketama_hash(key):
+    """
+    Hashes a key on the ring.
+    """
+    if isinstance(key, str):
+        key = key.encode()
+
+    return next(_points(md5(key).digest()))
+
+
+class KetamaRing:
+    """
+    A consistent hash ring mapping keys to nodes.
+
+    Every node gets a share of the 160 points per node of the ring
+    proportional to its weight. The sorted points are computed once, so a
+    lookup is a binary search.
+
+    Attributes:
+        nodes: a dict mapping the node names ("host:port") to their weight.
+    """
+
+    def __init__(self, nodes):
+        if not isinstance(nodes, Mapping):
+            nodes = {node: 1 for node in nodes}
+
+        assert(nodes)
+
+        self.nodes = dict(nodes)
+
+        total_weight = sum(self.nodes.values())
+        ring = []
+
+        for node, weight in self.nodes.items():
+            pct = _single(_single(weight) / _single(total_weight))
+            share = floor(_single(pct * 40.0 * len(self.nodes)))
+
+            for k in range(share):
+                digest = md5("{}-{}".format(node, k).encode()).digest()
+                ring.extend((point, node) for point in _points(digest))
+
+        ring.sort()
+
+        self._points = [point for point, node in ring]
+        self._nodes = [node for point, node in ring]
+
+    def __len__(self):
+        return len(self._points)
+
+    def get(self, key):
+        """
+        Returns the node owning a key.
+        """
+        index = bisect_left(self._points, ketama_hash(key))
+
+        if index == len(self._points):
+            index = 0
+
+        return self._nodes[index]
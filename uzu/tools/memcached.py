@@ -19,11 +19,18 @@ See http://code.google.com/p/memcached/wiki/BinaryProtocolRevamped
 
 import socket
 from struct import pack
+from itertools import count
+from functools import partial
+from collections import OrderedDict, deque
+from collections.abc import Mapping
 
 from tornado.iostream import IOStream, SSLIOStream
 from tornado.gen import coroutine, Task
+from tornado.concurrent import Future
+from tornado.ioloop import IOLoop, PeriodicCallback
 
-from uzu.tools.structure import structure, packable_structure
+from uzu.tools.structure import StructureBase, structure, packable_structure
+from uzu.tools.ketama import KetamaRing
 
 
 class MemcachedError(Exception):
@@ -35,6 +42,12 @@ class RequestError(MemcachedError):
 class ServerError(MemcachedError):
     pass
 
+class NotMyVbucketError(RequestError):
+    pass
+
+class ConnectionClosedError(MemcachedError):
+    pass
+
 
 RequestHeader = packable_structure(
     "RequestHeader",
@@ -69,7 +82,38 @@ ResponseHeader = packable_structure(
 )
 
 Request = structure("Request", ("header", "extra", "key", "value"))
-Response = structure("Response", ("request", "header", "extra", "key", "value"))
+
+
+class Response(StructureBase):
+    """
+    A response from the Memcached server.
+
+    The body is kept as it was read from the stream: extra, key and value
+    are memoryview slices of it, so getting them copies nothing.
+    """
+
+    __slots__ = ("request", "header", "body")
+
+    @property
+    def extra(self):
+        return memoryview(self.body)[:self.header.extra_len]
+
+    @property
+    def key(self):
+        start = self.header.extra_len
+        return memoryview(self.body)[start:start + self.header.key_len]
+
+    @property
+    def value(self):
+        start = self.header.extra_len + self.header.key_len
+        return memoryview(self.body)[start:]
+
+    def decode_value(self, encoding="utf-8"):
+        """
+        Decodes the value straight from the response body.
+        """
+        return str(self.value, encoding)
+
 
 status_reason = {
     0x0000 : "no error",
@@ -92,27 +136,104 @@ status_reason = {
     0x0086 : "temporary failure"
 }
 
+# Values at least this large are written without being copied into a frame.
+LARGE_VALUE = 16 * 1024
+
+def status_error(status):
+    """
+    Returns the exception matching a response status, or None if the status
+    is not an error.
+    """
+    if status == 0x0000:
+        return None
+    elif status == 0x0007:
+        return NotMyVbucketError(status_reason[status])
+    elif status > 0x0080:
+        return ServerError(status_reason[status])
+    else:
+        return RequestError(status_reason[status])
+
+
 class Memcached:
+    """
+    A Memcached binary protocol client.
+
+    Requests are pipelined: each request is tagged with a unique opaque
+    value and written as soon as it is issued, while a single reader loop
+    hands every response back to the future waiting for it. Many coroutines
+    can thus share one connection with several requests in flight.
+    """
 
     def __init__(self, host, port):
         self._server = (host, port)
         stream = socket.socket(socket.AF_INET, socket.SOCK_STREAM, 0)
         self._stream = IOStream(stream)
-        self.connect()
+        self._stream.set_close_callback(self._on_close)
+
+        self._opaque = count(1)
+        self._pending = OrderedDict()
+        self._reading = False
+        self._connection = None
 
     def __del__(self):
         self.close()
 
     def connect(self):
-        self._stream.connect(self._server)
+        """
+        Connects to the Memcached server, once. Requests sent while
+        connecting are buffered by the stream.
+
+        return: A future resolved when the connection is established.
+        """
+        if self._connection is None:
+            self._connection = Future()
+            self._stream.connect(
+                self._server,
+                callback=partial(self._connection.set_result, None)
+            )
+
+        return self._connection
 
     def close(self):
         self._stream.close()
 
-    @coroutine
+    def closed(self):
+        return self._stream.closed()
+
+    def pending(self):
+        """
+        The number of requests waiting for a response.
+        """
+        return len(self._pending)
+
+    def _on_close(self):
+        """
+        Fails every request still waiting for a response.
+        """
+        error = ConnectionClosedError(
+            "connection to {}:{} closed".format(*self._server)
+        )
+
+        pending, self._pending = self._pending, OrderedDict()
+        self._reading = False
+
+        if self._connection is not None and not self._connection.done():
+            self._connection.set_exception(error)
+
+        for request, future in pending.values():
+            future.set_exception(error)
+
+    def _next_opaque(self):
+        return pack("!I", next(self._opaque) & 0xFFFFFFFF)
+
     def send_package(self, header, extra, key, value):
         """
         Sends a package to the Memcached server.
+
+        The request is registered like the queries are, so that the reader
+        loop hands its response over instead of dropping it.
+
+        return: A Future resolved with the Response.
         """
 
         assert(isinstance(header, RequestHeader))
@@ -122,14 +243,20 @@ class Memcached:
 
         request = Request(header, extra, key, value)
 
-        yield Task(self._stream.write, header.pack() + extra + key + value)
+        future, = self._submit([request])
 
-        return request
+        return future
 
     @coroutine
-    def receive_package(self, request):
-        assert(isinstance(request, Request))
+    def receive_package(self, request=None):
+        """
+        Reads the next response from the Memcached server.
 
+        parameters:
+            request: the request the response answers, if known. The reader
+                loop reads the responses without it and sets it once it
+                matched their opaque value.
+        """
         read_bytes = self._stream.read_bytes
 
         packed_header = yield Task(read_bytes, ResponseHeader._packer.size)
@@ -137,26 +264,90 @@ class Memcached:
 
         body = yield Task(read_bytes, header.body_len)
 
-        extra = body[:header.extra_len]
-        key = body[header.extra_len:header.extra_len + header.key_len]
-        value = body[header.extra_len + header.key_len:]
-
-        response = Response(request, header, extra, key, value)
+        response = Response(request, header, body)
 
         return response
 
+    def _submit(self, requests):
+        """
+        Sends requests and returns the futures resolved with their responses.
+
+        The requests are registered before being written, so that a response
+        can never come back before its request is known.
+        """
+        futures = []
+
+        for request in requests:
+            future = Future()
+            self._pending[request.header.opaque] = (request, future)
+            futures.append(future)
+
+        self.connect()
+        self.send_packages(requests)
+
+        if not self._reading:
+            self._read_loop()
+
+        return futures
+
     @coroutine
-    def query(self,
+    def _read_loop(self):
+        """
+        Reads responses while requests are in flight and dispatches them.
+        """
+        self._reading = True
+
+        try:
+            while self._pending:
+                response = yield self.receive_package()
+                self._dispatch(response)
+        except Exception as error:
+            pending, self._pending = self._pending, OrderedDict()
+
+            for request, future in pending.values():
+                future.set_exception(error)
+        finally:
+            self._reading = False
+
+    def _dispatch(self, response):
+        """
+        Resolves the future waiting for a response.
+
+        The server answers in request order, so any request sent before the
+        one being answered and still pending is a quiet request the server
+        chose not to answer: its future is resolved with None.
+        """
+        opaque = response.header.opaque
+
+        if opaque not in self._pending:
+            return
+
+        while True:
+            pending_opaque, (request, future) = self._pending.popitem(
+                last=False
+            )
+
+            if pending_opaque == opaque:
+                break
+
+            future.set_result(None)
+
+        response.request = request
+        future.set_result(response)
+
+    def make_request(self,
         opcode,
         extra=b"",
         key=b"",
         value=b"",
         data_type=0x00,
         vbucket_id=0x0000,
-        opaque=bytes(4),
+        opaque=None,
         cas=bytes(8)
     ):
         """
+        Builds a request without sending it.
+
         parameters:
             opcode: the command code.
             extra: the extra data.
@@ -164,8 +355,12 @@ class Memcached:
             value: The value associated with the command.
             data_type: Reserved for future use, so live it blank.
             vbucket_id: The virtual bucket for this command.
-            opaque: a value that will be returned in the response.
+            opaque: a value that will be returned in the response. It is
+                used to match the response to its request, so leave it
+                blank to get a unique one.
             cas: data version check
+
+        return: The request.
         """
 
         assert(isinstance(opcode, int))
@@ -180,6 +375,9 @@ class Memcached:
         if isinstance(value, str):
             value = value.encode()
 
+        if opaque is None:
+            opaque = self._next_opaque()
+
         header = RequestHeader(
             magic = 0x80,
             opcode = opcode,
@@ -187,42 +385,126 @@ class Memcached:
             extra_len = len(extra),
             data_type = data_type,
             vbucket_id = vbucket_id,
-            body_len = len(extra + key + value),
+            body_len = len(extra) + len(key) + len(value),
             opaque = opaque,
             cas = cas
         )
 
-        request = yield self.send_package(header, extra, key, value)
-        response = yield self.receive_package(request)
+        return Request(header, extra, key, value)
 
-        status = response.header.status
+    def send_packages(self, requests):
+        """
+        Sends several requests to the Memcached server.
+
+        The headers are packed into one preallocated buffer and the requests
+        are framed by a single join, so their fields are copied only once.
+        Values of LARGE_VALUE bytes or more are not copied at all: they are
+        written to the stream on their own, between the frames.
+        """
+        size = RequestHeader._packer.size
+        headers = memoryview(bytearray(size * len(requests)))
+        parts = []
 
-        if status != 0x0000:
-            if status > 0x0080:
-                raise ServerError(status_reason[status])
+        for n, request in enumerate(requests):
+            header = headers[n * size:(n + 1) * size]
+            request.header.pack_into(header)
+
+            parts.extend((header, request.extra, request.key))
+
+            if len(request.value) < LARGE_VALUE:
+                parts.append(request.value)
             else:
-                raise RequestError(status_reason[status])
+                self._stream.write(b"".join(parts))
+                self._stream.write(request.value)
+                parts = []
+
+        if parts:
+            self._stream.write(b"".join(parts))
+
+        return requests
+
+    @coroutine
+    def query(self,
+        opcode,
+        extra=b"",
+        key=b"",
+        value=b"",
+        data_type=0x00,
+        vbucket_id=0x0000,
+        opaque=None,
+        cas=bytes(8)
+    ):
+        """
+        Sends a request and waits for its response.
+
+        parameters:
+            opcode: the command code.
+            extra, key, value, data_type, vbucket_id, opaque, cas: the
+                request fields, see make_request.
+
+        return: The server response.
+        """
+        request = self.make_request(
+            opcode,
+            extra,
+            key,
+            value,
+            data_type,
+            vbucket_id,
+            opaque,
+            cas
+        )
+
+        response = yield self._submit([request])[0]
+
+        error = status_error(response.header.status)
+
+        if error:
+            raise error
 
         return response
 
+    @coroutine
+    def query_multi(self, requests):
+        """
+        Sends a batch of requests in a single write, followed by a NOOP.
+
+        The NOOP response tells when the server is done with the batch, so
+        the requests may use quiet opcodes: the server only answers those
+        that have something to report.
+
+        parameters:
+            requests: the requests built with make_request.
+
+        return: The list of the responses, in request order. A request the
+            server did not answer gets None. Error statuses are not raised.
+        """
+        requests = list(requests)
+        requests.append(self.make_request(0x0A))
+
+        responses = yield self._submit(requests)
+
+        return responses[:-1]
+
     #====================#
     # Memcached commands #
     #====================#
 
     @coroutine
-    def get(self, key):
+    def get(self, key, vbucket_id=0x0000):
         """
         Get data from Memcached server.
 
         parameters:
             key: the to get.
+            vbucket_id: the virtual bucket of the key.
 
         return: The server response.
         """
         assert key
 
         opcode = 0x00 #if not quiet else 0x09
-        response =  yield self.query(opcode, key=key)
+        response =  yield self.query(opcode, key=key, vbucket_id=vbucket_id)
 
         # response.extra = GetExtra.unpack(response.extra)
 
@@ -232,6 +514,48 @@ class Memcached:
     def get_key(self, key):
         raise NotImplementedError
 
+    @coroutine
+    def get_multi(self, keys, vbuckets=None):
+        """
+        Get data for several keys in one round trip.
+
+        Each key is sent as a quiet GETKQ request, so missing keys add no
+        response traffic.
+
+        parameters:
+            keys: the keys to get.
+            vbuckets: an optional dict mapping each key to its virtual bucket.
+
+        return: A dict mapping each key found to its server response.
+        """
+        keys = list(keys)
+        vbuckets = vbuckets or {}
+        opcode = 0x0D
+
+        responses = yield self.query_multi(
+            self.make_request(
+                opcode,
+                key=key,
+                vbucket_id=vbuckets.get(key, 0x0000)
+            )
+            for key in keys
+        )
+
+        hits = {}
+
+        for key, response in zip(keys, responses):
+            if response is None or response.header.status == 0x0001:
+                continue
+
+            error = status_error(response.header.status)
+
+            if error:
+                raise error
+
+            hits[key] = response
+
+        return hits
+
     @coroutine
     def set(
         self,
@@ -239,7 +563,8 @@ class Memcached:
         value=b"",
         cas=bytes(8),
         flags=0x0000,
-        expiration=0
+        expiration=0,
+        vbucket_id=0x0000
     ):
         """
         Change the key data on Memcached server.
@@ -252,6 +577,7 @@ class Memcached:
             cas: TODO
             flags: TODO
             expiration: TODO
+            vbucket_id: the virtual bucket of the key.
 
         return: The server response.
         """
@@ -264,7 +590,8 @@ class Memcached:
             extra=extra,
             key=key,
             value=value,
-            cas=cas
+            cas=cas,
+            vbucket_id=vbucket_id
         )
 
         assert(response.header.cas)
@@ -278,7 +605,8 @@ class Memcached:
         value=b"",
         cas=bytes(8),
         flags=0x0000,
-        expiration=0
+        expiration=0,
+        vbucket_id=0x0000
     ):
         """
         Add a new key to the Memcached Server.
@@ -291,6 +619,7 @@ class Memcached:
             cas: TODO
             flags: TODO
             expiration: TODO
+            vbucket_id: the virtual bucket of the key.
 
         return: The server response.
         """
@@ -304,7 +633,8 @@ class Memcached:
             extra=extra,
             key=key,
             value=value,
-            cas=cas
+            cas=cas,
+            vbucket_id=vbucket_id
         )
 
         assert(response.header.cas)
@@ -318,7 +648,8 @@ class Memcached:
         value=b"",
         cas=bytes(8),
         flags=0x0000,
-        expiration=0
+        expiration=0,
+        vbucket_id=0x0000
     ):
         """
         Replace data associated to a key on Memcached server.
@@ -330,6 +661,7 @@ class Memcached:
             cas: TODO
             flags: TODO
             expiration: TODO
+            vbucket_id: the virtual bucket of the key.
 
         return: The server response.
         """
@@ -343,7 +675,8 @@ class Memcached:
             extra=extra,
             key=key,
             value=value,
-            cas=cas
+            cas=cas,
+            vbucket_id=vbucket_id
         )
 
         assert(response.header.cas)
@@ -351,14 +684,151 @@ class Memcached:
         return response
 
     @coroutine
-    def delete(self, key):
+    def delete(self, key, vbucket_id=0x0000):
         assert(key)
 
         opcode = 0x04 #if not quiet else 0x14
-        response =  yield self.query(opcode, key=key)
+        response =  yield self.query(opcode, key=key, vbucket_id=vbucket_id)
 
         return response
 
+    @coroutine
+    def _store_multi(self, opcode, items, flags, expiration, vbuckets):
+        """
+        Sends a quiet storage command for each (key, value) pair.
+
+        return: A dict mapping each key that failed to its error.
+        """
+        if isinstance(items, Mapping):
+            items = items.items()
+
+        items = list(items)
+        vbuckets = vbuckets or {}
+        extra = pack("!II", flags, expiration)
+
+        responses = yield self.query_multi(
+            self.make_request(
+                opcode,
+                extra=extra,
+                key=key,
+                value=value,
+                vbucket_id=vbuckets.get(key, 0x0000)
+            )
+            for key, value in items
+        )
+
+        return self._failures((key for key, value in items), responses)
+
+    @staticmethod
+    def _failures(keys, responses):
+        failures = {}
+
+        for key, response in zip(keys, responses):
+            if response is not None:
+                error = status_error(response.header.status)
+
+                if error:
+                    failures[key] = error
+
+        return failures
+
+    @coroutine
+    def set_multi(self, items, flags=0x0000, expiration=0, vbuckets=None):
+        """
+        Set several keys in one round trip, with quiet SETQ requests.
+
+        parameters:
+            items: a mapping or an iterable of (key, value) pairs.
+            flags: the flags stored with every value.
+            expiration: the expiration of every value.
+            vbuckets: an optional dict mapping each key to its virtual bucket.
+
+        return: A dict mapping each key that could not be set to its error.
+        """
+        failures = yield self._store_multi(
+            0x11,
+            items,
+            flags,
+            expiration,
+            vbuckets
+        )
+
+        return failures
+
+    @coroutine
+    def add_multi(self, items, flags=0x0000, expiration=0, vbuckets=None):
+        """
+        Add several new keys in one round trip, with quiet ADDQ requests.
+
+        parameters:
+            items: a mapping or an iterable of (key, value) pairs.
+            flags: the flags stored with every value.
+            expiration: the expiration of every value.
+            vbuckets: an optional dict mapping each key to its virtual bucket.
+
+        return: A dict mapping each key that could not be added to its error.
+        """
+        failures = yield self._store_multi(
+            0x12,
+            items,
+            flags,
+            expiration,
+            vbuckets
+        )
+
+        return failures
+
+    @coroutine
+    def replace_multi(self, items, flags=0x0000, expiration=0, vbuckets=None):
+        """
+        Replace several keys in one round trip, with quiet REPLACEQ requests.
+
+        parameters:
+            items: a mapping or an iterable of (key, value) pairs.
+            flags: the flags stored with every value.
+            expiration: the expiration of every value.
+            vbuckets: an optional dict mapping each key to its virtual bucket.
+
+        return: A dict mapping each key that could not be replaced to its
+            error.
+        """
+        failures = yield self._store_multi(
+            0x13,
+            items,
+            flags,
+            expiration,
+            vbuckets
+        )
+
+        return failures
+
+    @coroutine
+    def delete_multi(self, keys, vbuckets=None):
+        """
+        Delete several keys in one round trip, with quiet DELETEQ requests.
+
+        parameters:
+            keys: the keys to delete.
+            vbuckets: an optional dict mapping each key to its virtual bucket.
+
+        return: A dict mapping each key that could not be deleted to its
+            error.
+        """
+        keys = list(keys)
+        vbuckets = vbuckets or {}
+        opcode = 0x14
+
+        responses = yield self.query_multi(
+            self.make_request(
+                opcode,
+                key=key,
+                vbucket_id=vbuckets.get(key, 0x0000)
+            )
+            for key in keys
+        )
+
+        return self._failures(keys, responses)
+
     @coroutine
     def increment(self, key, delta, initial, expiration=0):
         raise NotImplementedError
@@ -393,7 +863,9 @@ class Memcached:
 
     @coroutine
     def noop(self):
-        raise NotImplementedError
+        response = yield self.query(0x0A)
+
+        return response
 
     @coroutine
     def version(self):
@@ -422,4 +894,418 @@ class Memcached:
         value = "python-memcached\x00" + login + "\x00" + password
         response = yield self.query(0x21, key="PLAIN", value=value)
 
-        return response
\ No newline at end of file
+        return response
+
+
+def _pooled(name):
+    """
+    Builds a MemcachedPool method running a Memcached command on one of the
+    pool connections.
+    """
+
+    @coroutine
+    def command(self, *args, **kwargs):
+        client = yield self.connection()
+        response = yield getattr(client, name)(*args, **kwargs)
+
+        return response
+
+    command.__name__ = name
+    command.__doc__ = getattr(Memcached, name).__doc__
+
+    return command
+
+
+class MemcachedPool:
+    """
+    A pool of connections to a Memcached server.
+
+    The connections are shared: as requests are pipelined, each command
+    runs on the open connection with the fewest requests in flight.
+    Connections are opened lazily, another one only once every open
+    connection has max_pending requests in flight, up to max_connections.
+    Until one is open, coroutines wait for it in FIFO order, and they all
+    get the error if it can not be opened.
+
+    Dead connections are evicted, and failed connection attempts are
+    retried after an exponential backoff. A periodic health check pings
+    the connections, closes those that stalled and keeps min_connections
+    open.
+
+    Attributes:
+        min_connections: the number of connections kept open.
+        max_connections: the maximum number of connections.
+        max_pending: the number of requests in flight on every connection
+            from which another connection is opened.
+        backoff: the first delay in seconds before retrying to connect.
+        max_backoff: the maximum delay before retrying to connect.
+        health_check_interval: the delay in seconds between health checks.
+        credentials: the login and password each connection authenticates
+            with through SASL PLAIN, or None.
+    """
+
+    def __init__(
+        self,
+        host,
+        port,
+        min_connections=1,
+        max_connections=10,
+        max_pending=16,
+        backoff=0.1,
+        max_backoff=10.0,
+        health_check_interval=30.0,
+        credentials=None
+    ):
+        assert(0 <= min_connections <= max_connections)
+        assert(max_connections > 0 and max_pending > 0)
+
+        self._server = (host, port)
+
+        self.min_connections = min_connections
+        self.max_connections = max_connections
+        self.max_pending = max_pending
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.health_check_interval = health_check_interval
+        self.credentials = credentials
+
+        self._clients = []
+        self._opening = 0
+        self._waiters = deque()
+        self._failures = 0
+        self._retry_at = 0
+        self._pinging = set()
+        self._health_check = None
+
+    def __len__(self):
+        """
+        The number of open or opening connections.
+        """
+        return len(self._clients) + self._opening
+
+    @coroutine
+    def _open(self):
+        """
+        Opens a new connection, after the backoff delay if the last attempts
+        failed.
+        """
+        io_loop = IOLoop.current()
+
+        if self._retry_at > io_loop.time():
+            yield Task(io_loop.add_timeout, self._retry_at)
+
+        client = Memcached(*self._server)
+
+        try:
+            yield client.connect()
+
+            if self.credentials is not None:
+                yield client.sasl_plain_auth(*self.credentials)
+        except MemcachedError:
+            client.close()
+            self._failures += 1
+            delay = self.backoff * 2 ** (self._failures - 1)
+            self._retry_at = io_loop.time() + min(delay, self.max_backoff)
+            raise
+
+        self._failures = 0
+
+        return client
+
+    @coroutine
+    def _grow(self):
+        """
+        Opens a new connection and hands it to the waiting coroutines. If it
+        can not be opened and no other one is opening, they get the error.
+        """
+        self._opening += 1
+
+        try:
+            client = yield self._open()
+        except Exception as error:
+            self._opening -= 1
+
+            if not self._opening:
+                waiters, self._waiters = self._waiters, deque()
+
+                for waiter in waiters:
+                    waiter.set_exception(error)
+
+            return
+
+        self._opening -= 1
+        self._clients.append(client)
+
+        waiters, self._waiters = self._waiters, deque()
+
+        for waiter in waiters:
+            waiter.set_result(client)
+
+    def _evict(self):
+        """
+        Forgets the connections that were closed.
+        """
+        if any(client.closed() for client in self._clients):
+            self._clients = [
+                client for client in self._clients if not client.closed()
+            ]
+
+    @coroutine
+    def connection(self):
+        """
+        Picks the open connection with the fewest requests in flight. The
+        connection is shared with the other coroutines, it is not checked
+        out.
+
+        return: A connected Memcached client.
+        """
+        self._start_health_check()
+        self._evict()
+
+        client = None
+
+        for candidate in self._clients:
+            if client is None or candidate.pending() < client.pending():
+                client = candidate
+
+        if client is None:
+            waiter = Future()
+            self._waiters.append(waiter)
+
+        if (
+            (client is None or client.pending() >= self.max_pending)
+            and not self._opening
+            and len(self) < self.max_connections
+        ):
+            self._grow()
+
+        if client is None:
+            client = yield waiter
+
+        return client
+
+    def close(self):
+        """
+        Stops the health check and closes the connections. The requests
+        still in flight fail.
+        """
+        if self._health_check is not None:
+            self._health_check.stop()
+            self._health_check = None
+
+        clients, self._clients = self._clients, []
+
+        for client in clients:
+            client.close()
+
+    def _start_health_check(self):
+        if self._health_check is None and self.health_check_interval:
+            self._health_check = PeriodicCallback(
+                self._check_health,
+                self.health_check_interval * 1000
+            )
+            self._health_check.start()
+
+    def _check_health(self):
+        """
+        Evicts dead connections, closes the stalled ones, pings the others,
+        and opens connections up to min_connections.
+        """
+        for client in self._clients:
+            if client in self._pinging:
+                # The last ping did not come back.
+                client.close()
+            elif not client.closed():
+                self._ping(client)
+
+        self._evict()
+
+        for n in range(self.min_connections - len(self)):
+            self._grow()
+
+    @coroutine
+    def _ping(self, client):
+        self._pinging.add(client)
+
+        try:
+            yield client.noop()
+        except MemcachedError:
+            client.close()
+        finally:
+            self._pinging.discard(client)
+
+    get = _pooled("get")
+    get_multi = _pooled("get_multi")
+    set = _pooled("set")
+    set_multi = _pooled("set_multi")
+    add = _pooled("add")
+    add_multi = _pooled("add_multi")
+    replace = _pooled("replace")
+    replace_multi = _pooled("replace_multi")
+    delete = _pooled("delete")
+    delete_multi = _pooled("delete_multi")
+    noop = _pooled("noop")
+
+
+def _routed(name):
+    """
+    Builds a MemcachedCluster method running a single key Memcached command
+    on the node owning the key.
+    """
+
+    @coroutine
+    def command(self, key, *args, **kwargs):
+        response = yield getattr(self.node(key), name)(key, *args, **kwargs)
+
+        return response
+
+    command.__name__ = name
+    command.__doc__ = getattr(Memcached, name).__doc__
+
+    return command
+
+
+class MemcachedCluster:
+    """
+    A client for a tier of Memcached servers.
+
+    Keys are mapped to the servers with a libketama compatible consistent
+    hash ring, and every server is reached through a MemcachedPool.
+    Multi-key commands are split into one batch per server, and the batches
+    run in parallel.
+    """
+
+    def __init__(self, servers, **pool_options):
+        """
+        parameters:
+            servers: an iterable of (host, port) or (host, port, weight).
+            pool_options: the MemcachedPool options.
+        """
+        weights = {}
+        self._pools = {}
+
+        for server in servers:
+            host, port = server[:2]
+            name = "{}:{}".format(host, port)
+
+            weights[name] = server[2] if len(server) > 2 else 1
+            self._pools[name] = MemcachedPool(host, port, **pool_options)
+
+        self._ring = KetamaRing(weights)
+
+    def node(self, key):
+        """
+        Returns the pool of the server owning a key.
+        """
+        return self._pools[self._ring.get(key)]
+
+    def _split(self, keys):
+        """
+        Groups keys by the server owning them.
+        """
+        groups = {}
+
+        for key in keys:
+            groups.setdefault(self._ring.get(key), []).append(key)
+
+        return groups
+
+    @coroutine
+    def _multi(self, name, groups):
+        """
+        Runs a multi-key command on every server in parallel, and merges the
+        dicts they return.
+        """
+        results = yield [
+            getattr(self._pools[node], name)(batch)
+            for node, batch in groups.items()
+        ]
+
+        merged = {}
+
+        for result in results:
+            merged.update(result)
+
+        return merged
+
+    @coroutine
+    def get_multi(self, keys):
+        """
+        See Memcached.get_multi, the keys are spread over the servers.
+        """
+        result = yield self._multi("get_multi", self._split(keys))
+
+        return result
+
+    @coroutine
+    def delete_multi(self, keys):
+        """
+        See Memcached.delete_multi, the keys are spread over the servers.
+        """
+        result = yield self._multi("delete_multi", self._split(keys))
+
+        return result
+
+    @coroutine
+    def _store_multi(self, name, items, flags, expiration):
+        if isinstance(items, Mapping):
+            items = items.items()
+
+        groups = {}
+
+        for key, value in items:
+            groups.setdefault(self._ring.get(key), []).append((key, value))
+
+        results = yield [
+            getattr(self._pools[node], name)(batch, flags, expiration)
+            for node, batch in groups.items()
+        ]
+
+        failures = {}
+
+        for result in results:
+            failures.update(result)
+
+        return failures
+
+    @coroutine
+    def set_multi(self, items, flags=0x0000, expiration=0):
+        """
+        See Memcached.set_multi, the keys are spread over the servers.
+        """
+        failures = yield self._store_multi("set_multi", items, flags, expiration)
+
+        return failures
+
+    @coroutine
+    def add_multi(self, items, flags=0x0000, expiration=0):
+        """
+        See Memcached.add_multi, the keys are spread over the servers.
+        """
+        failures = yield self._store_multi("add_multi", items, flags, expiration)
+
+        return failures
+
+    @coroutine
+    def replace_multi(self, items, flags=0x0000, expiration=0):
+        """
+        See Memcached.replace_multi, the keys are spread over the servers.
+        """
+        failures = yield self._store_multi(
+            "replace_multi",
+            items,
+            flags,
+            expiration
+        )
+
+        return failures
+
+    def close(self):
+        for pool in self._pools.values():
+            pool.close()
+
+    get = _routed("get")
+    set = _routed("set")
+    add = _routed("add")
+    replace = _routed("replace")
+    delete = _routed("delete")
@@ -16,6 +16,7 @@ along with Uzu.  If not, see <http://www.gnu.org/licenses/>.
 """
 
 from struct import Struct
+from collections.abc import MutableMapping
 
 class StructureBase:
 
@@ -51,11 +52,56 @@ class PackableStructureBase(StructureBase):
     def pack(self):
         return self._packer.pack(*self)
 
+    def pack_into(self, buffer, offset=0):
+        self._packer.pack_into(buffer, offset, *self)
+
     @classmethod
     def unpack(cls, data):
         return cls(*cls._packer.unpack(data))
 
 
+class MappingStructureBase(MutableMapping):
+    """
+    A mutable mapping holding its values in slots. Its keys are limited to
+    the fields it was built with, and it needs no dict.
+    """
+
+    __slots__ = ()
+
+    def __init__(self, *args, **kwargs):
+        self.update(*args, **kwargs)
+
+    def __getitem__(self, key):
+        try:
+            return self._members[key].__get__(self)
+        except (KeyError, AttributeError):
+            raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        self._members[key].__set__(self, value)
+
+    def __delitem__(self, key):
+        try:
+            self._members[key].__delete__(self)
+        except AttributeError:
+            raise KeyError(key)
+
+    def __iter__(self):
+        for key, member in self._members.items():
+            try:
+                member.__get__(self)
+            except AttributeError:
+                continue
+
+            yield key
+
+    def __len__(self):
+        return sum(1 for key in self)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
 def structure(name, fields):
     attrs = {
         "__slots__" : tuple(fields)
@@ -72,6 +118,18 @@ def packable_structure(name, fields, format):
     return type(name, (PackableStructureBase,), attrs)
 
 
+def mapping_structure(name, fields):
+    # The slots are prefixed, so that fields can not hide the mapping methods.
+    attrs = {
+        "__slots__" : tuple("_" + field for field in fields)
+    }
+
+    cls = type(name, (MappingStructureBase,), attrs)
+    cls._members = {field: cls.__dict__["_" + field] for field in fields}
+
+    return cls
+
+
 if __name__ == "__main__":
     import sys
     Point = structure("Point", ("x", "y"))